@@ -1,8 +1,13 @@
 import { useEffect, useMemo, useRef, useState } from "react";
 import Header from "./components/Header";
 import Meter from "./components/Meter";
+import { diffEdit, typingFrames } from "./draftSync";
 
 const API_BASE = "http://127.0.0.1:8000";
+const WS_BASE = API_BASE.replace(/^http/, "ws");
+// mirror the backend's WS_MAX_MESSAGE_BYTES / WS_MAX_DRAFT_CHARS: a bigger frame closes the socket
+const WS_MAX_FRAME_BYTES = 131072;
+const WS_MAX_DRAFT_CHARS = 20000;
 
 function getSessionId() {
   let id = localStorage.getItem("cooked_session_id");
@@ -13,6 +18,33 @@ function getSessionId() {
   return id;
 }
 
+// parse a text/event-stream body, calling onEvent(event, json) for each message
+async function readEvents(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buf.indexOf("\n\n")) !== -1) {
+      const raw = buf.slice(0, sep);
+      buf = buf.slice(sep + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of raw.split("\n")) {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
 function App() {
   const sessionId = useMemo(() => getSessionId(), []);
 
@@ -32,6 +64,104 @@ function App() {
   const hintCountRef = useRef(0);
   const finalCountRef = useRef(0);
 
+  const currentMetrics = (text) => ({
+    chars_typed: text.length,
+    time_spent_ms:
+      typingStartRef.current === null ? 0 : Math.max(0, Math.round(performance.now() - typingStartRef.current)),
+    backspaces: backspacesRef.current,
+    attempt_count: attemptCountRef.current,
+    hint_count: hintCountRef.current,
+    final_request_count: finalCountRef.current,
+  });
+
+  // ---- one long-lived socket per tab: turns, live meter, server pushes ----
+  const wsRef = useRef(null);
+  const inputRef = useRef("");
+  inputRef.current = input;
+  const sentDraftRef = useRef(""); // the draft as the server has it
+
+  // bring the server's copy of the draft up to `next` (resync: start over from empty)
+  const syncDraft = (ws, next, resync = false) => {
+    if ([...next].length > WS_MAX_DRAFT_CHARS) return; // too long for the live meter; sending still works
+    if (resync) {
+      ws.send(JSON.stringify({ type: "typing", text: "" }));
+      sentDraftRef.current = "";
+    }
+    for (const frame of typingFrames(diffEdit(sentDraftRef.current, next), currentMetrics(next))) ws.send(frame);
+    sentDraftRef.current = next;
+  };
+
+  const appendToReply = (chunk) =>
+    setMessages((prev) => {
+      const next = [...prev];
+      const last = next[next.length - 1];
+      next[next.length - 1] = { ...last, content: last.content + chunk };
+      return next;
+    });
+
+  // score / token / reset / done, from either the socket or the SSE fallback
+  const onTurnEvent = (event, body) => {
+    if (event === "score") {
+      // meter updates before the tutor starts answering
+      setLastResult(body);
+      setMode(body.state); // RAW / SIZZLING / COOKED
+    } else if (event === "token") {
+      appendToReply(body.text);
+    } else if (event === "reset") {
+      // the reply broke off mid-stream; the fallback reply follows
+      setMessages((prev) => [...prev.slice(0, -1), { ...prev[prev.length - 1], content: "" }]);
+    } else if (event === "done") {
+      setLastResult(body);
+    }
+  };
+
+  useEffect(() => {
+    let retryMs = 500;
+    let timer = null;
+    let closed = false;
+
+    const connect = () => {
+      const ws = new WebSocket(`${WS_BASE}/ws/${sessionId}`);
+      wsRef.current = ws;
+      ws.onopen = () => {
+        retryMs = 500;
+        // the server scores the draft from deltas; give it the text typed so far
+        syncDraft(ws, inputRef.current, true);
+      };
+      ws.onmessage = (e) => {
+        const { type, ...body } = JSON.parse(e.data);
+        if (type === "ping") ws.send(JSON.stringify({ type: "pong" }));
+        else if (type === "hello") {
+          // the server keeps the conversation; a reload picks it back up
+          setMessages(body.messages);
+          setLastResult((prev) => ({ ...prev, score: body.score, unlocked: body.unlocked }));
+        } else if (type === "meter") {
+          setLastResult((prev) => ({ ...prev, ...body }));
+          setMode(body.state);
+        } else if (type === "error") {
+          console.warn("ws:", body.detail);
+          // the server lost track of the draft: resend it whole
+          if (String(body.detail).startsWith("draft out of sync")) syncDraft(ws, inputRef.current, true);
+          else if (String(body.detail).startsWith("draft longer than")) sentDraftRef.current = "";
+        }
+        else onTurnEvent(type, body);
+      };
+      ws.onclose = () => {
+        if (wsRef.current === ws) wsRef.current = null;
+        if (!closed) timer = setTimeout(connect, (retryMs = Math.min(retryMs * 2, 10000)));
+      };
+    };
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      wsRef.current?.close();
+    };
+  }, [sessionId]);
+
+  const socket = () => (wsRef.current?.readyState === WebSocket.OPEN ? wsRef.current : null);
+
   const onChangeInput = (e) => {
     const next = e.target.value;
 
@@ -39,6 +169,8 @@ function App() {
     if (next.length < input.length) backspacesRef.current += 1;
 
     setInput(next);
+    const ws = socket();
+    if (ws) syncDraft(ws, next);
   };
 
   const sendMessage = async () => {
@@ -48,58 +180,48 @@ function App() {
     // count this as an attempt
     attemptCountRef.current += 1;
 
-    const now = performance.now();
-    const timeSpentMs =
-      typingStartRef.current === null ? 0 : Math.max(0, Math.round(now - typingStartRef.current));
-
     const payload = {
       session_id: sessionId,
       mode: "SOCRATIC", // keep simple for now; you can add a dropdown later
       user_text: text,
-      metrics: {
-        chars_typed: text.length,
-        time_spent_ms: timeSpentMs,
-        backspaces: backspacesRef.current,
-        attempt_count: attemptCountRef.current,
-        hint_count: hintCountRef.current,
-        final_request_count: finalCountRef.current,
-      },
+      metrics: currentMetrics(text),
     };
 
     // show the user message immediately
     setMessages((prev) => [...prev, { role: "user", content: text }]);
     setInput("");
 
+    // reset per-turn typing metrics
+    typingStartRef.current = null;
+    backspacesRef.current = 0;
+
+    // a message too big for one frame goes over HTTP instead
+    const ws = socket();
+    const frame = JSON.stringify({ type: "chat", ...payload });
+    if (ws && new TextEncoder().encode(frame).length <= WS_MAX_FRAME_BYTES) {
+      // assistant bubble fills in from score/token/done pushes
+      setMessages((prev) => [...prev, { role: "assistant", content: "" }]);
+      ws.send(frame);
+      sentDraftRef.current = ""; // the server starts a new draft after a turn
+      return;
+    }
+
     try {
-      const res = await fetch(`${API_BASE}/chat`, {
+      const res = await fetch(`${API_BASE}/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(payload),
       });
 
-      const data = await res.json();
+      // assistant bubble that fills in as tokens arrive
+      setMessages((prev) => [...prev, { role: "assistant", content: "" }]);
 
-      // this is where your Vidhi work shows up
-      setLastResult(data);
-      setMode(data.state); // RAW / SIZZLING / COOKED
-
-      // append assistant reply
-      setMessages((prev) => [...prev, { role: "assistant", content: data.assistant_text }]);
-
-      // optional: store history for analytics later
-      const prevHistory = JSON.parse(localStorage.getItem("cooked_history") || "[]");
-      prevHistory.push({
-        text,
-        timestamp: Date.now(),
-        effort: data.score,
-        state: data.state,
-        tags: data.tags,
+      let done = false;
+      await readEvents(res, (event, body) => {
+        if (event === "done") done = true;
+        onTurnEvent(event, body);
       });
-      localStorage.setItem("cooked_history", JSON.stringify(prevHistory));
-
-      // reset per-turn typing metrics
-      typingStartRef.current = null;
-      backspacesRef.current = 0;
+      if (!done) throw new Error("stream ended early");
     } catch (err) {
       setMessages((prev) => [
         ...prev,
@@ -0,0 +1,43 @@
+// Keeping the server's copy of the draft in step with the textarea over /ws.
+// The server indexes the draft by code point (a Python str), so edit offsets are
+// code points too, never UTF-16 units: an emoji is 1, not 2.
+
+export const WS_CHUNK_CHARS = 2000; // long inserts (pastes, resyncs) go out in pieces this size
+
+const isHigh = (s, i) => /[\uD800-\uDBFF]/.test(s[i] ?? "");
+const isLow = (s, i) => /[\uDC00-\uDFFF]/.test(s[i] ?? "");
+
+// the single edit that turns `prev` into `next` (what a keystroke or paste changed)
+export function diffEdit(prev, next) {
+  let start = 0;
+  while (start < prev.length && start < next.length && prev[start] === next[start]) start++;
+  if (start > 0 && isHigh(prev, start - 1)) start--; // don't end the common prefix mid-pair
+  let end = 0;
+  while (
+    end < prev.length - start &&
+    end < next.length - start &&
+    prev[prev.length - 1 - end] === next[next.length - 1 - end]
+  )
+    end++;
+  if (end > 0 && isLow(prev, prev.length - end)) end--; // nor start the common suffix mid-pair
+  return {
+    at: [...prev.slice(0, start)].length,
+    delete: [...prev.slice(start, prev.length - end)].length,
+    insert: next.slice(start, next.length - end),
+  };
+}
+
+// the typing frames for one diffEdit edit (at/delete in code points): a long insert is
+// split so no frame gets near the size limit, each piece starting where the last one ended
+export function typingFrames({ at, delete: del, insert }, metrics) {
+  const frames = [];
+  do {
+    let chunk = insert.slice(0, WS_CHUNK_CHARS);
+    if (chunk.length < insert.length && /[\uD800-\uDBFF]$/.test(chunk)) chunk = chunk.slice(0, -1); // keep surrogate pairs whole
+    frames.push(JSON.stringify({ type: "typing", edits: [{ at, delete: del, insert: chunk }], metrics }));
+    at += [...chunk].length; // the server counts code points
+    del = 0;
+    insert = insert.slice(chunk.length);
+  } while (insert);
+  return frames;
+}
@@ -0,0 +1,62 @@
+// node --test (npm test): diffEdit / typingFrames against the server's code-point indexing
+import assert from "node:assert/strict";
+import { test } from "node:test";
+import { WS_CHUNK_CHARS, diffEdit, typingFrames } from "./draftSync.js";
+
+// what the server's DraftScorer.replace does: splice a list of code points
+function applyEdit(text, { at, delete: del, insert }) {
+  const cps = [...text];
+  assert.ok(at + del <= cps.length, `edit ${at}+${del} past the end of a ${cps.length}-code-point draft`);
+  cps.splice(at, del, ...insert);
+  return cps.join("");
+}
+
+test("offsets are code points after non-BMP text", () => {
+  assert.deepEqual(diffEdit("a😀b", "a😀cb"), { at: 2, delete: 0, insert: "c" });
+  assert.deepEqual(diffEdit("😀😀x", "😀😀"), { at: 2, delete: 1, insert: "" });
+  assert.deepEqual(diffEdit("a😀😀b", "a😀b"), { at: 2, delete: 1, insert: "" });
+});
+
+test("an edit never splits a surrogate pair", () => {
+  // 😀 and 😁 share their high surrogate, 😀 and 𝟘 their low one
+  assert.deepEqual(diffEdit("x😀", "x😁"), { at: 1, delete: 1, insert: "😁" });
+  assert.deepEqual(diffEdit("😀y", "𝟘y"), { at: 0, delete: 1, insert: "𝟘" });
+  assert.deepEqual(diffEdit("a😀b", "a😁b"), { at: 1, delete: 1, insert: "😁" });
+});
+
+test("replaying diffEdit on the server's draft tracks the textarea", () => {
+  const alphabet = ["a", "b", " ", "é", "😀", "😁", "𝟘", "👍🏽"];
+  let seed = 7;
+  const rand = (n) => (seed = (seed * 1103515245 + 12345) % 2 ** 31) % n;
+  let client = "";
+  let server = "";
+  for (let i = 0; i < 2000; i++) {
+    const cps = [...client];
+    const at = rand(cps.length + 1);
+    const del = rand(Math.min(3, cps.length - at) + 1);
+    const ins = Array.from({ length: rand(3) }, () => alphabet[rand(alphabet.length)]);
+    cps.splice(at, del, ...ins);
+    const next = cps.join("");
+    server = applyEdit(server, diffEdit(client, next));
+    assert.equal(server, next);
+    client = next;
+  }
+});
+
+test("a long non-BMP paste is chunked at code-point offsets", () => {
+  const before = "é😀";
+  const paste = "a" + "😀".repeat(WS_CHUNK_CHARS) + "𝟘b";
+  const after = before + paste + "!";
+  const frames = typingFrames(diffEdit(before + "!", after), {}).map((f) => JSON.parse(f));
+  assert.ok(frames.length > 1);
+  let server = before + "!";
+  for (const { edits } of frames) {
+    for (const e of edits) {
+      assert.ok(!/^[\uDC00-\uDFFF]|[\uD800-\uDBFF]$/.test(e.insert), "chunk splits a surrogate pair");
+      assert.ok(e.insert.length <= WS_CHUNK_CHARS);
+      server = applyEdit(server, e);
+    }
+  }
+  assert.equal(server, after);
+  assert.equal(frames[0].edits[0].at, 2);
+});
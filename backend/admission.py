@@ -0,0 +1,214 @@
+# backend/admission.py
+"""
+Admission control in front of LLM calls.
+
+A turn is always scored; only its LLM call is admitted or shed. Shed turns
+get the deterministic fallback reply straight away instead of queueing
+behind slow LLM calls.
+
+    1. per-session token bucket   (one student spamming /chat; opt-in, see below)
+    2. global token bucket        (overall LLM spend / provider quota of live turns)
+    3. priority concurrency gate  (at most ADMIT_LLM_CONCURRENCY calls in flight;
+                                   FINAL/REFLECTION wait briefly for a slot,
+                                   repeated SOCRATIC pings don't wait at all)
+
+The per-session bucket is off unless ADMIT_SESSION_RPS is set (e.g. 0.5 with
+ADMIT_SESSION_BURST=5): a student working through a problem can easily send
+several messages a minute, and shedding those is worse than the LLM spend.
+The global bucket and the concurrency gate protect the service either way.
+
+Background work doesn't draw on the live students' global bucket: /chat/batch
+turns have their own (ADMIT_BATCH_RPS) and wait for a token instead of being
+shed, speculative prefetches have theirs in speculation.py (SPECULATE_PER_MIN).
+Both still queue behind live turns at the gate.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+ENABLED = os.getenv("ADMIT", "1") != "0"
+LLM_CONCURRENCY = int(os.getenv("ADMIT_LLM_CONCURRENCY", "64"))
+LLM_QUEUE = int(os.getenv("ADMIT_LLM_QUEUE", "256"))
+SESSION_RPS = float(os.getenv("ADMIT_SESSION_RPS", "0"))    # 0 = no per-session limit
+SESSION_BURST = float(os.getenv("ADMIT_SESSION_BURST", "5"))
+GLOBAL_RPS = float(os.getenv("ADMIT_GLOBAL_RPS", "200"))
+GLOBAL_BURST = float(os.getenv("ADMIT_GLOBAL_BURST", "400"))
+BATCH_RPS = float(os.getenv("ADMIT_BATCH_RPS", "20"))      # 0 = unlimited
+BATCH_BURST = float(os.getenv("ADMIT_BATCH_BURST", "20"))
+SESSION_BUCKETS_MAX = int(os.getenv("ADMIT_SESSION_BUCKETS_MAX", "100000"))
+
+# lower = more important
+PRIORITY = {"FINAL": 0, "REFLECTION": 1, "HINT": 2, "SOCRATIC": 3}
+REPEAT_SOCRATIC = 4   # SOCRATIC right after another SOCRATIC turn
+BATCH = 5             # /chat/batch: offline tools, happy to wait behind live students
+SPECULATIVE = 6       # prefetch of a reply nobody asked for yet: only ever uses an idle slot
+
+# how long each priority may wait for a free slot before it's shed
+MAX_WAIT_S = {0: 2.0, 1: 2.0, 2: 0.5, 3: 0.1, REPEAT_SOCRATIC: 0.0, BATCH: 30.0, SPECULATIVE: 0.0}
+
+def priority_for(mode: str, prev_mode: Optional[str]) -> int:
+    if mode == "SOCRATIC" and prev_mode == "SOCRATIC":
+        return REPEAT_SOCRATIC
+    return PRIORITY.get(mode, PRIORITY["SOCRATIC"])
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.stamp = burst, now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_s(self) -> float:
+        """Seconds until take() can succeed (as of the last take)."""
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+
+class PriorityGate:
+    """
+    Bounded concurrency with a bounded, priority-ordered wait queue. When the
+    queue is full a newcomer displaces the least important waiter (or is
+    shed itself). Single event loop, so no locking.
+    """
+
+    def __init__(self, limit: int, max_queue: int):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []   # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, f in self._waiters if not f.done())
+
+    async def acquire(self, priority: int, max_wait_s: float) -> bool:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return True
+        if max_wait_s <= 0:
+            return False
+
+        if len(self._waiters) >= self.max_queue:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                return False
+            self._waiters.remove(worst)
+            heapq.heapify(self._waiters)
+            worst[2].set_result(False)
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), fut)
+        heapq.heappush(self._waiters, entry)
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), max_wait_s)
+        except asyncio.TimeoutError:
+            return self._abandon(entry)  # True if the slot arrived just as we gave up
+        except asyncio.CancelledError:  # client went away while waiting
+            if self._abandon(entry):
+                self.release()
+            raise
+
+    def _abandon(self, entry: Tuple[int, int, asyncio.Future]) -> bool:
+        fut = entry[2]
+        if fut.done():
+            return fut.result()
+        fut.cancel()
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        return False
+
+    def release(self) -> None:
+        # hand the slot straight to the most important live waiter
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                fut.set_result(True)
+                return
+        self.active -= 1
+
+class Admission:
+    def __init__(self):
+        now = time.monotonic()
+        self.gate = PriorityGate(LLM_CONCURRENCY, LLM_QUEUE)
+        self.global_bucket = TokenBucket(GLOBAL_RPS, GLOBAL_BURST, now)
+        self.batch_bucket = TokenBucket(BATCH_RPS, BATCH_BURST, now)
+        self._sessions: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"session_rate": 0, "global_rate": 0, "batch_rate": 0, "saturated": 0}
+
+    def _session_bucket(self, session_id: str, now: float) -> TokenBucket:
+        b = self._sessions.get(session_id)
+        if b is None:
+            b = self._sessions[session_id] = TokenBucket(SESSION_RPS, SESSION_BURST, now)
+            if len(self._sessions) > SESSION_BUCKETS_MAX:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        return b
+
+    async def _enter(self, session_id: str, priority: int) -> Optional[str]:
+        """None if admitted (caller must release the gate), else why it was shed."""
+        now = time.monotonic()
+        max_wait_s = MAX_WAIT_S.get(priority, 0.0)
+        if priority < BATCH:
+            if SESSION_RPS > 0 and not self._session_bucket(session_id, now).take(now):
+                return "session_rate"
+            if GLOBAL_RPS > 0 and not self.global_bucket.take(now):
+                return "global_rate"
+        elif priority == BATCH and BATCH_RPS > 0:
+            # batch turns are paced, not shed: wait for a token within the same wait budget
+            started = now
+            while not self.batch_bucket.take(now):
+                if now - started + self.batch_bucket.wait_s() > max_wait_s:
+                    return "batch_rate"
+                await asyncio.sleep(self.batch_bucket.wait_s())
+                now = time.monotonic()
+            max_wait_s -= now - started
+        if not await self.gate.acquire(priority, max_wait_s):
+            return "saturated"
+        return None
+
+    @asynccontextmanager
+    async def admit(self, session_id: str, priority: int) -> AsyncIterator[Optional[str]]:
+        """
+        async with admission.admit(sid, prio) as shed:
+            if shed: use the fallback   else: call the LLM
+        """
+        if not ENABLED:
+            yield None
+            return
+        shed = await self._enter(session_id, priority)
+        if shed:
+            self.shed[shed] += 1
+            yield shed
+            return
+        self.admitted += 1
+        try:
+            yield None
+        finally:
+            self.gate.release()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": ENABLED,
+            "llm_in_flight": self.gate.active,
+            "llm_waiting": self.gate.waiting,
+            "llm_concurrency": self.gate.limit,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "session_buckets": len(self._sessions),
+        }
+
+admission = Admission()
@@ -0,0 +1,316 @@
+# backend/bench.py
+"""
+Reproducible benchmarks for the scoring helpers and /chat.
+
+    python bench.py                          # micro + e2e, JSON to stdout
+    python bench.py --only micro --quick
+    python bench.py --out bench.json --baseline bench_baseline.json
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --only import            # cold `import main` vs IMPORT_BUDGET_MS
+
+The /chat load test runs in-process against the ASGI app, with the LLM
+replaced by a stub that sleeps for a configurable latency (no network, no quota).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+# measure the real path, not cache hits / reused replies / shed turns
+os.environ.setdefault("LLM_CACHE", "0")
+os.environ.setdefault("NEAR_DUP", "0")
+os.environ.setdefault("ADMIT", "0")
+
+from metrics import EffortMetrics, compute_effort_score, generate_summary, skill_tags, structure_points
+from session_store import Session
+from task_detect import detect_task_type
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# cold-start budget for our own modules: `import main` minus the fastapi/pydantic imports
+# it can't avoid (was ~1100ms while llm_client built the Gemini SDK client at import)
+IMPORT_BUDGET_MS = 150
+
+TEXT_SIZES = [50, 500, 5_000, 20_000]
+SESSION_LENGTHS = [1, 100, 1_000, 10_000]
+
+SAMPLE = (
+    "Step 1: I think we solve the integral of x e^x by parts because the derivative of x is simple. "
+    "So u = x and dv = e^x dx, then du = dx. What is the next step? I compared it with substitution. "
+)
+
+def sample_text(n_chars: int) -> str:
+    return (SAMPLE * (n_chars // len(SAMPLE) + 1))[:n_chars]
+
+def peak_rss_mb() -> float:
+    if resource is None:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KB on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def calibration_ms() -> float:
+    """
+    Median time of a fixed pure-Python workload. Baseline comparisons divide by
+    the ratio of calibrations, so a slower/faster machine (or a noisy neighbour)
+    doesn't read as a code regression.
+    """
+    def work():
+        acc = 0
+        for i in range(20_000):
+            acc += len(str(i)) * (i & 7)
+        return acc
+
+    samples = []
+    for _ in range(15):
+        t0 = time.perf_counter_ns()
+        work()
+        samples.append((time.perf_counter_ns() - t0) / 1e6)
+    return round(statistics.median(samples), 4)
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    q = statistics.quantiles(samples_ms, n=100, method="inclusive") if len(samples_ms) > 1 else samples_ms * 99
+    return {
+        "p50_ms": round(q[49], 4),
+        "p95_ms": round(q[94], 4),
+        "p99_ms": round(q[98], 4),
+        "n": len(samples_ms),
+    }
+
+# ---------------------------
+# Micro-benchmarks
+# ---------------------------
+
+def time_calls(fn: Callable[[], object], min_time_s: float, max_calls: int) -> Dict[str, float]:
+    fn()  # warm up (regex caches, lazy tables)
+    samples: List[float] = []
+    start = time.perf_counter()
+    while len(samples) < max_calls and (time.perf_counter() - start) < min_time_s:
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append((time.perf_counter_ns() - t0) / 1e6)
+
+    out = percentiles(samples)
+    total_s = sum(samples) / 1000
+    out["ops_per_s"] = round(len(samples) / total_s, 1) if total_s else 0.0
+    return out
+
+def make_turns(n: int) -> List[dict]:
+    rnd = random.Random(n)
+    tags = ["Recall", "Application", "Analysis", "Synthesis", "Evaluation"]
+    return [
+        {
+            "mode": rnd.choice(["SOCRATIC", "HINT", "FINAL", "REFLECTION"]),
+            "score": rnd.randint(0, 100),
+            "unlocked": i > n // 2,
+            "tags": rnd.sample(tags, 2),
+        }
+        for i in range(n)
+    ]
+
+def run_micro(quick: bool) -> Dict[str, dict]:
+    min_time = 0.05 if quick else 0.3
+    max_calls = 2_000 if quick else 20_000
+    results: Dict[str, dict] = {}
+    m = EffortMetrics(320, 55000, 25, 2, 1, 0)
+
+    for size in TEXT_SIZES:
+        text = sample_text(size)
+        results[f"compute_effort_score[{size}ch]"] = time_calls(lambda: compute_effort_score(text, m), min_time, max_calls)
+        results[f"skill_tags[{size}ch]"] = time_calls(lambda: skill_tags(text), min_time, max_calls)
+        results[f"structure_points[{size}ch]"] = time_calls(lambda: structure_points(text), min_time, max_calls)
+        results[f"detect_task_type[{size}ch]"] = time_calls(lambda: detect_task_type(text), min_time, max_calls)
+
+    for n in SESSION_LENGTHS:
+        turns = make_turns(n)
+        s = Session(session_id=f"bench-{n}")
+        for t in turns:
+            s.add_turn(t["mode"], t["score"], t["unlocked"], t["tags"])
+        results[f"generate_summary[list,{n}turns]"] = time_calls(lambda: generate_summary(turns), min_time, max_calls)
+        results[f"generate_summary[session,{n}turns]"] = time_calls(lambda: generate_summary(s.stats), min_time, max_calls)
+
+    return results
+
+# ---------------------------
+# Cold import
+# ---------------------------
+
+# fastapi pulls in pydantic.v1 as soon as a route takes a model body
+FRAMEWORK_IMPORTS = "import fastapi, fastapi.responses, fastapi.middleware.cors, pydantic, pydantic.v1"
+
+def _import_ms(stmt: str) -> float:
+    code = f"import time; t = time.perf_counter(); {stmt}; print((time.perf_counter() - t) * 1000)"
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+def run_import(quick: bool) -> Dict[str, dict]:
+    """Fresh interpreter per sample, so nothing is cached in sys.modules."""
+    runs = 3 if quick else 7
+    total = [_import_ms("import main") for _ in range(runs)]
+    framework = [_import_ms(FRAMEWORK_IMPORTS) for _ in range(runs)]
+    out = percentiles(total)
+    own = round(statistics.median(total) - statistics.median(framework), 1)
+    out.update({"framework_ms": round(statistics.median(framework), 1), "own_ms": own,
+                "budget_ms": IMPORT_BUDGET_MS, "over_budget": own > IMPORT_BUDGET_MS})
+    return {"import_main": out}
+
+# ---------------------------
+# /chat load test (stubbed LLM)
+# ---------------------------
+
+def install_llm_stub(latency_ms: float, jitter_ms: float) -> None:
+    import main
+
+    async def fake_ask(system_prompt: str, user_prompt: str, mode=None):
+        await asyncio.sleep(max(0.0, random.gauss(latency_ms, jitter_ms)) / 1000)
+        return "What would your first step be?"
+
+    async def fake_stream(system_prompt: str, user_prompt: str, mode=None):
+        yield await fake_ask(system_prompt, user_prompt, mode)
+
+    main.ask_gemini_async = fake_ask
+    main.stream_gemini = fake_stream
+
+async def _load_test(requests: int, concurrency: int, sessions: int) -> Dict[str, float]:
+    import httpx
+    import main
+
+    rnd = random.Random(0)
+    modes = ["SOCRATIC"] * 6 + ["HINT"] * 2 + ["FINAL", "SUMMARY"]
+    latencies: List[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            payload = {
+                "session_id": f"bench-{i % sessions}",
+                "mode": rnd.choice(modes),
+                "user_text": sample_text(rnd.choice([40, 300, 1200])),
+                "metrics": {"chars_typed": 300, "time_spent_ms": 40000, "backspaces": 10, "attempt_count": 2},
+            }
+            async with sem:
+                t0 = time.perf_counter_ns()
+                r = await client.post("/chat", json=payload)
+                latencies.append((time.perf_counter_ns() - t0) / 1e6)
+            if r.status_code != 200:
+                errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    out = percentiles(latencies)
+    out["throughput_rps"] = round(requests / elapsed, 1)
+    out["errors"] = errors
+    return out
+
+def run_e2e(requests: int, concurrency: int, sessions: int, latency_ms: float, jitter_ms: float) -> Dict[str, dict]:
+    install_llm_stub(latency_ms, jitter_ms)
+    key = f"chat[c={concurrency},llm={latency_ms:g}ms]"
+    result = asyncio.run(_load_test(requests, concurrency, sessions))
+    result.update({"requests": requests, "sessions": sessions, "llm_latency_ms": latency_ms})
+    return {key: result}
+
+# ---------------------------
+# Baseline comparison
+# ---------------------------
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], threshold: float,
+            speed: float = 1.0) -> List[dict]:
+    """
+    Flags benchmarks whose p50 got more than `threshold`x slower than the baseline.
+    `speed` = this machine's calibration / the baseline's (micro-benchmarks only;
+    the /chat test is dominated by the stubbed LLM sleep).
+    """
+    rows = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base or not base.get("p50_ms"):
+            continue
+        scale = 1.0 if name.startswith("chat[") else speed
+        ratio = cur["p50_ms"] / (base["p50_ms"] * scale)
+        rows.append({
+            "name": name,
+            "baseline_p50_ms": base["p50_ms"],
+            "p50_ms": cur["p50_ms"],
+            "ratio": round(ratio, 2),
+            "regression": ratio > threshold,
+        })
+    return rows
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--only", choices=["micro", "e2e", "import"])
+    ap.add_argument("--quick", action="store_true", help="fewer iterations (smoke run)")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=200)
+    ap.add_argument("--sessions", type=int, default=500)
+    ap.add_argument("--llm-latency-ms", type=float, default=300)
+    ap.add_argument("--llm-jitter-ms", type=float, default=50)
+    ap.add_argument("--out", help="write results JSON here (default: stdout)")
+    ap.add_argument("--baseline", help="compare against this results JSON")
+    ap.add_argument("--save-baseline", help="write results as the new baseline")
+    ap.add_argument("--threshold", type=float, default=1.5, help="p50 slowdown ratio counted as a regression")
+    args = ap.parse_args()
+
+    random.seed(0)
+    calibration = calibration_ms()
+    benchmarks: Dict[str, dict] = {}
+    if args.only in (None, "import"):
+        benchmarks.update(run_import(args.quick))
+    if args.only in (None, "micro"):
+        benchmarks.update(run_micro(args.quick))
+    if args.only in (None, "e2e"):
+        n = min(args.requests, 300) if args.quick else args.requests
+        benchmarks.update(run_e2e(n, args.concurrency, args.sessions, args.llm_latency_ms, args.llm_jitter_ms))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "calibration_ms": calibration,
+        "peak_rss_mb": peak_rss_mb(),
+        "benchmarks": benchmarks,
+    }
+
+    regressions = [name for name, b in benchmarks.items() if b.get("over_budget")]
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        speed = calibration / baseline["calibration_ms"] if baseline.get("calibration_ms") else 1.0
+        report["comparison"] = compare(benchmarks, baseline["benchmarks"], args.threshold, speed)
+        regressions += [r["name"] for r in report["comparison"] if r["regression"]]
+    if args.baseline or regressions:
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+    if regressions:
+        print("REGRESSIONS:", ", ".join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+# backend/context_builder.py
+"""
+Builds the user prompt for a turn from the session's history, within a token budget:
+
+    Earlier in this conversation:      <- rolling summary, one short line per folded message
+    - Student: ...
+    Recent messages:                   <- newest messages that fit CONTEXT_TOKENS
+    Student: ... / Tutor: ...
+    Student's new message:
+    <user_text>
+
+Messages that slide out of the recent window are folded into the summary
+once (Session.folded marks how far), so each turn only pays for what is new.
+A message that falls out of the session's history ring before any prompt
+build got to it (several messages per turn, batch turns) is folded by
+Session.add_message just before it goes.
+All of this goes in the user part; the system prompt stays byte-identical
+across turns so provider-side prefix caching can reuse it.
+"""
+import os
+
+from session_store import Message, Session
+
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1200"))          # recent messages
+SUMMARY_TOKENS = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "250"))   # rolling summary
+MESSAGE_TOKENS = int(os.getenv("CONTEXT_MESSAGE_TOKENS", "400"))   # cap for one long paste
+SUMMARY_LINE_WORDS = 24
+
+CHARS_PER_TOKEN = 4  # close enough for English prose / math on Gemini and GPT tokenizers
+
+SPEAKERS = {"user": "Student", "assistant": "Tutor"}
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def _clip(text: str, max_tokens: int) -> str:
+    limit = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= limit else text[:limit].rstrip() + " …"
+
+def _summary_line(m: Message) -> str:
+    words = m.content.split()
+    gist = " ".join(words[:SUMMARY_LINE_WORDS])
+    if len(words) > SUMMARY_LINE_WORDS:
+        gist += " …"
+    return f"- {SPEAKERS[m.role]}: {gist}"
+
+def fold(s: Session, upto: int) -> None:
+    """Folds messages with msg_total index < upto into the session's summary."""
+    first = s.msg_total - len(s.history)  # msg_total index of history[0]
+    for i in range(max(s.folded, first), upto):
+        line = _summary_line(s.history[i - first])
+        s.add_summary_line(line, estimate_tokens(line))
+    s.folded = max(s.folded, upto)
+
+    # over budget: drop the oldest lines, but keep the opening one (usually the problem itself)
+    while s.summary_tokens > SUMMARY_TOKENS and len(s.summary_lines) > 1:
+        s.drop_summary_line(1, estimate_tokens(s.summary_lines[1]))
+
+def fold_evicted(s: Session) -> None:
+    """Folds history[0], which add_message() is about to push out of the ring."""
+    if CONTEXT_TOKENS > 0:
+        fold(s, s.msg_total - len(s.history) + 1)
+
+def build_user_prompt(s: Session, user_text: str) -> str:
+    """
+    Call after begin_turn() has appended `user_text` to s.history.
+    First turns (nothing before this message) get the bare text, as before.
+    """
+    if CONTEXT_TOKENS <= 0:
+        return user_text
+
+    first = s.msg_total - len(s.history)
+    start = len(s.history) - 1  # history[-1] is this turn's message
+    budget = CONTEXT_TOKENS
+    recent = []
+    while start > 0 and first + start - 1 >= s.folded:
+        m = s.history[start - 1]
+        line = f"{SPEAKERS[m.role]}: {_clip(m.content, MESSAGE_TOKENS)}"
+        cost = estimate_tokens(line)
+        if cost > budget:
+            break
+        budget -= cost
+        recent.append(line)
+        start -= 1
+
+    fold(s, first + start)
+
+    if not s.summary_lines and not recent:
+        return user_text
+
+    parts = []
+    if s.summary_lines:
+        parts.append("Earlier in this conversation:\n" + "\n".join(s.summary_lines))
+    if recent:
+        parts.append("Recent messages:\n" + "\n".join(reversed(recent)))
+    parts.append("Student's new message:\n" + user_text)
+    return "\n\n".join(parts)
@@ -0,0 +1,131 @@
+# backend/fake_llm.py
+"""
+Local fake LLM server (OpenAI-compatible /v1/chat/completions) for load-testing
+/chat with no network and no quota.
+
+    uvicorn fake_llm:app --port 8001
+    LLM_ROUTE=fake:fake-tutor uvicorn main:app --port 8000
+
+Knobs (env):
+    FAKE_LLM_LATENCY_MS     median time to first token (default 400)
+    FAKE_LLM_LATENCY_SIGMA  lognormal spread of that latency (default 0.5; 0 = fixed)
+    FAKE_LLM_ERROR_RATE     fraction of requests answered with HTTP 503 (default 0)
+    FAKE_LLM_TOKENS_PER_S   generation speed after the first token (default 80; 0 = instant)
+    FAKE_LLM_REPLIES        optional JSON file {"SOCRATIC": ["template", ...], ...}
+Templates can use {topic} (first words of the student's message) and {model}.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "400"))
+LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.5"))
+ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+TOKENS_PER_S = float(os.getenv("FAKE_LLM_TOKENS_PER_S", "80"))
+
+REPLIES = {
+    "SOCRATIC": [
+        "Good question about {topic}. What do you already know that might help here? Try writing Step 1.",
+        "Before we go further with {topic}: which method do you think fits, and why?",
+    ],
+    "HINT": [
+        "Hint: break {topic} into smaller parts and look at the first one on its own.",
+        "Hint: think about a similar problem you've solved before and reuse its first step.",
+    ],
+    "FINAL": [
+        "Here is the answer for {topic}.\n- Key step: identify the structure first.\n- Then apply the method step by step.",
+    ],
+    "REFLECTION": [
+        "(1) What was the key step in {topic}? (2) What would you try first next time? (3) What mistake will you avoid?",
+    ],
+}
+
+if os.getenv("FAKE_LLM_REPLIES"):
+    with open(os.environ["FAKE_LLM_REPLIES"], encoding="utf-8") as f:
+        REPLIES.update(json.load(f))
+
+app = FastAPI()
+
+def guess_mode(system_prompt: str) -> str:
+    """Reads the mode back out of the prompts.py text."""
+    p = system_prompt.lower()
+    if "socratic" in p:
+        return "SOCRATIC"
+    if "one helpful hint" in p:
+        return "HINT"
+    if "final answer clearly" in p:
+        return "FINAL"
+    if "reflection" in p:
+        return "REFLECTION"
+    return "SOCRATIC"
+
+def make_reply(messages: list, model: str) -> str:
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    user = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    user = user.rpartition("Student's new message:\n")[2]  # skip the conversation context
+    topic = " ".join(user.split()[:6]) or "this"
+    return random.choice(REPLIES[guess_mode(system)]).format(topic=topic, model=model)
+
+def first_token_delay_s() -> float:
+    if LATENCY_SIGMA <= 0:
+        return LATENCY_MS / 1000
+    return random.lognormvariate(0, LATENCY_SIGMA) * LATENCY_MS / 1000
+
+def tokens(text: str):
+    # words with their trailing space, roughly what a tokenizer would emit
+    words = text.split(" ")
+    return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": "fake-tutor", "object": "model"}]}
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict):
+    model = body.get("model", "fake-tutor")
+    await asyncio.sleep(first_token_delay_s())
+
+    if random.random() < ERROR_RATE:
+        return JSONResponse({"error": {"message": "fake overload", "type": "server_error"}}, status_code=503)
+
+    reply = make_reply(body.get("messages", []), model)
+    cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        if TOKENS_PER_S > 0:
+            await asyncio.sleep(len(tokens(reply)) / TOKENS_PER_S)
+        return {
+            "id": cid,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+        }
+
+    async def events():
+        for tok in tokens(reply):
+            chunk = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": tok}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if TOKENS_PER_S > 0:
+                await asyncio.sleep(1 / TOKENS_PER_S)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, port=int(os.getenv("FAKE_LLM_PORT", "8001")))
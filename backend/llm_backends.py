@@ -0,0 +1,232 @@
+# backend/llm_backends.py
+"""
+LLM backends behind llm_client. Each one takes (system_prompt, user_prompt) and
+returns the reply text; errors are raised and llm_client turns them into None
+(-> the caller's fallback text).
+
+Routes are "kind:model" strings:
+    gemini:gemini-2.5-flash
+    openai:gpt-4o-mini          (any OpenAI-compatible /chat/completions endpoint)
+    fake:fake-tutor             (the bundled fake_llm.py server, for load tests)
+"""
+import json
+import os
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+httpx = None  # imported by make_backend(), so importing this module stays cheap
+
+# connection pool shared by every async call (one worker can hold many turns in flight)
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+KEEPALIVE_EXPIRY_S = float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "30"))
+REQUEST_TIMEOUT_S = float(os.getenv("LLM_REQUEST_TIMEOUT_S", "60"))
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+FAKE_LLM_URL = os.getenv("FAKE_LLM_URL", "http://127.0.0.1:8001/v1")
+GEMINI_WARMUP_URL = "https://generativelanguage.googleapis.com/"
+
+def _pool_limits():
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY_S,
+    )
+
+class LLMBackend:
+    kind = "base"
+
+    def __init__(self, model: str):
+        self.model = model
+
+    @property
+    def route(self) -> str:
+        return f"{self.kind}:{self.model}"
+
+    def generate_sync(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def generate(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def warmup(self) -> None:
+        """Opens a pooled connection to the provider; raises if it can't be reached."""
+
+    async def aclose(self) -> None:
+        pass
+
+# ---------------------------
+# Gemini (google-genai SDK)
+# ---------------------------
+
+class GeminiBackend(LLMBackend):
+    kind = "gemini"
+
+    def __init__(self, model: str, api_key: Optional[str] = GEMINI_API_KEY):
+        super().__init__(model)
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set")
+
+        from google import genai
+        from google.genai import types
+
+        # the SDK passes its own per-request timeout (None = wait forever) and ignores the
+        # client's, so the HttpOptions one is what bounds a stalled read
+        self._http = httpx.AsyncClient(limits=_pool_limits(), timeout=httpx.Timeout(REQUEST_TIMEOUT_S, connect=5))
+        self._client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(httpx_async_client=self._http, timeout=int(REQUEST_TIMEOUT_S * 1000)),
+        )
+
+    @staticmethod
+    def _contents(system_prompt: str, user_prompt: str) -> str:
+        return f"{system_prompt}\n\nUser: {user_prompt}"
+
+    @staticmethod
+    def _text_or_none(response) -> Optional[str]:
+        if response.text:
+            return response.text.strip()
+
+        print("No text returned:", response)
+        return None
+
+    def generate_sync(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        response = self._client.models.generate_content(
+            model=self.model,
+            contents=self._contents(system_prompt, user_prompt),
+        )
+        return self._text_or_none(response)
+
+    async def generate(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        response = await self._client.aio.models.generate_content(
+            model=self.model,
+            contents=self._contents(system_prompt, user_prompt),
+        )
+        return self._text_or_none(response)
+
+    async def stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        chunks = await self._client.aio.models.generate_content_stream(
+            model=self.model,
+            contents=self._contents(system_prompt, user_prompt),
+        )
+        async for chunk in chunks:
+            if chunk.text:
+                yield chunk.text
+
+    async def warmup(self) -> None:
+        # any HTTP answer means DNS + TLS are done and the connection is pooled
+        await self._http.get(GEMINI_WARMUP_URL)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+# ---------------------------
+# OpenAI-compatible HTTP (also used for the fake server)
+# ---------------------------
+
+# one pooled client per base URL, shared by every model routed there
+_http_clients: Dict[Tuple[str, Optional[str]], "httpx.AsyncClient"] = {}
+
+class OpenAICompatBackend(LLMBackend):
+    kind = "openai"
+
+    def __init__(self, model: str, base_url: str = OPENAI_BASE_URL, api_key: Optional[str] = OPENAI_API_KEY):
+        super().__init__(model)
+        self.base_url = base_url.rstrip("/")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._headers = headers
+
+        key = (self.base_url, api_key)
+        if key not in _http_clients:
+            _http_clients[key] = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                limits=_pool_limits(),
+                timeout=httpx.Timeout(REQUEST_TIMEOUT_S, connect=5),
+            )
+        self._http = _http_clients[key]
+
+    def _body(self, system_prompt: str, user_prompt: str, stream: bool = False) -> dict:
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "stream": stream,
+        }
+
+    @staticmethod
+    def _text_or_none(data: dict) -> Optional[str]:
+        text = (data.get("choices") or [{}])[0].get("message", {}).get("content")
+        if text:
+            return text.strip()
+
+        print("No text returned:", data)
+        return None
+
+    def generate_sync(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        r = httpx.post(
+            f"{self.base_url}/chat/completions",
+            json=self._body(system_prompt, user_prompt),
+            headers=self._headers,
+            timeout=REQUEST_TIMEOUT_S,
+        )
+        r.raise_for_status()
+        return self._text_or_none(r.json())
+
+    async def generate(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        r = await self._http.post("/chat/completions", json=self._body(system_prompt, user_prompt))
+        r.raise_for_status()
+        return self._text_or_none(r.json())
+
+    async def stream(self, system_prompt: str, user_prompt: str) -> AsyncIterator[str]:
+        body = self._body(system_prompt, user_prompt, stream=True)
+        async with self._http.stream("POST", "/chat/completions", json=body) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    async def warmup(self) -> None:
+        await self._http.get("/models")
+
+    async def aclose(self) -> None:
+        if not self._http.is_closed:
+            await self._http.aclose()
+
+class FakeBackend(OpenAICompatBackend):
+    kind = "fake"
+
+    def __init__(self, model: str):
+        super().__init__(model, base_url=FAKE_LLM_URL, api_key=None)
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "openai": OpenAICompatBackend,
+    "fake": FakeBackend,
+}
+
+def make_backend(route: str) -> LLMBackend:
+    """'gemini:gemini-2.5-flash' -> GeminiBackend('gemini-2.5-flash')"""
+    kind, _, model = route.partition(":")
+    global httpx
+    if kind not in BACKENDS:
+        raise ValueError(f"unknown LLM backend {kind!r} in route {route!r}")
+    if httpx is None:
+        try:
+            import httpx
+        except Exception as e:
+            raise RuntimeError("httpx is required for LLM backends") from e
+    return BACKENDS[kind](model or "default")
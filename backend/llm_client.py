@@ -1,42 +1,272 @@
 # backend/llm_client.py
+import asyncio
 import os
-from typing import Optional
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional
 from dotenv import load_dotenv
+from response_cache import ResponseCache, cache_key
+from single_flight import SingleFlight
+from resilience import guard_for, guard_stats
 
 load_dotenv()
 
-API_KEY = os.getenv("GEMINI_API_KEY")
+# backends read their keys/URLs from the env, so import after load_dotenv()
+from llm_backends import LLMBackend, make_backend
 
-try:
-    from google import genai
-except Exception as e:
-    genai = None
-    print("IMPORT ERROR:", repr(e))
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")  # ✅ working current model
 
-_client = None
-if API_KEY and genai:
+# response cache: one policy per mode (FINAL/HINT are the priciest and most repeated)
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+
+def _cache_policy(mode: str, entries: int, mb: int, ttl_s: int) -> ResponseCache:
+    return ResponseCache(
+        max_entries=int(os.getenv(f"LLM_CACHE_{mode}_ENTRIES", entries)),
+        max_bytes=int(os.getenv(f"LLM_CACHE_{mode}_MB", mb)) * 1024 * 1024,
+        ttl_s=float(os.getenv(f"LLM_CACHE_{mode}_TTL_S", ttl_s)),
+    )
+
+CACHES = {
+    "FINAL": _cache_policy("FINAL", 2000, 16, 24 * 3600),
+    "HINT": _cache_policy("HINT", 5000, 16, 6 * 3600),
+    "DEFAULT": _cache_policy("DEFAULT", 5000, 8, 15 * 60),  # SOCRATIC / REFLECTION / untagged
+}
+
+def _cache_for(mode: Optional[str]) -> Optional[ResponseCache]:
+    if not CACHE_ENABLED:
+        return None
+    return CACHES.get(mode or "DEFAULT", CACHES["DEFAULT"])
+
+def cache_stats() -> dict:
+    return {mode: c.stats() for mode, c in CACHES.items()}
+
+# single-flight: identical concurrent calls (same route, system prompt, normalized text)
+# share one upstream request; finished results stay joinable for the window
+COALESCE_ENABLED = os.getenv("LLM_COALESCE", "1") != "0"
+flights = SingleFlight(window_s=float(os.getenv("LLM_COALESCE_WINDOW_MS", "500")) / 1000)
+
+def coalesce_stats() -> dict:
+    return flights.stats()
+
+# ---------------------------
+# Routing: mode -> backend
+# ---------------------------
+# LLM_ROUTE is the default "kind:model"; LLM_ROUTE_<MODE> overrides one mode, e.g.
+#   LLM_ROUTE_HINT=openai:gpt-4o-mini  LLM_ROUTE_FINAL=gemini:gemini-2.5-pro
+MODES = ["SOCRATIC", "HINT", "FINAL", "REFLECTION"]
+DEFAULT_ROUTE = os.getenv("LLM_ROUTE", f"gemini:{MODEL}")
+
+_routes: Dict[str, str] = {m: os.getenv(f"LLM_ROUTE_{m}", DEFAULT_ROUTE) for m in MODES + ["DEFAULT"]}
+
+# backends are built on first use (or by warmup()), not at import: the SDK
+# imports alone cost a worker ~0.5s of cold start
+_backends: Dict[str, Optional[LLMBackend]] = {}   # route -> backend (shared across modes)
+_backends_lock = threading.Lock()
+
+def _init_backend(route: str) -> Optional[LLMBackend]:
+    if route not in _backends:
+        with _backends_lock:
+            if route not in _backends:
+                try:
+                    _backends[route] = make_backend(route)
+                except Exception as e:
+                    print("CLIENT INIT ERROR:", route, repr(e))
+                    _backends[route] = None
+    return _backends[route]
+
+def backend_for(mode: Optional[str]) -> Optional[LLMBackend]:
+    return _init_backend(_routes.get(mode or "DEFAULT", _routes["DEFAULT"]))
+
+def routes() -> Dict[str, Optional[str]]:
+    return {m: (b.route if (b := _init_backend(r)) else None) for m, r in _routes.items()}
+
+# ---------------------------
+# Warmup / readiness
+# ---------------------------
+
+WARMUP_TIMEOUT_S = float(os.getenv("LLM_WARMUP_TIMEOUT_S", "3"))
+RECHECK_S = 5.0
+
+_reachable: Dict[str, bool] = {}
+_checked_at: Dict[str, float] = {}
+
+async def _check(route: str) -> None:
+    backend = await asyncio.to_thread(_init_backend, route)  # SDK imports block; keep them off the loop
+    if backend is None:
+        return
     try:
-        _client = genai.Client(api_key=API_KEY)
+        await asyncio.wait_for(backend.warmup(), WARMUP_TIMEOUT_S)
+        _reachable[route] = True
     except Exception as e:
-        print("CLIENT INIT ERROR:", repr(e))
+        print("LLM WARMUP FAILED:", route, repr(e))
+        _reachable[route] = False
+    _checked_at[route] = time.monotonic()
+
+async def warmup() -> None:
+    """Builds every routed backend and opens a pooled connection to each."""
+    await asyncio.gather(*(_check(r) for r in set(_routes.values())))
 
-def ask_gemini(system_prompt: str, user_prompt: str) -> Optional[str]:
-    if not _client:
+async def readiness() -> Dict[str, str]:
+    """
+    route -> reachable | circuit_open | unreachable | not_configured.
+    Unreachable routes are re-probed at most every RECHECK_S.
+    """
+    out = {}
+    for route in sorted(set(_routes.values())):
+        if not _reachable.get(route) and time.monotonic() - _checked_at.get(route, 0) >= RECHECK_S:
+            await _check(route)
+        backend = _backends.get(route)
+        if backend is None:
+            out[route] = "not_configured"
+        elif guard_for(backend).breaker.state == "open":
+            out[route] = "circuit_open"
+        else:
+            out[route] = "reachable" if _reachable.get(route) else "unreachable"
+    return out
+
+def health_stats() -> Dict[str, dict]:
+    """Breaker state, hedging and p95 latency per backend route."""
+    return guard_stats()
+
+# ---------------------------
+# Calls (names kept from the Gemini-only days; they go to whatever backend the mode routes to)
+# ---------------------------
+
+def ask_gemini(system_prompt: str, user_prompt: str, mode: Optional[str] = None) -> Optional[str]:
+    backend = backend_for(mode)
+    cache = _cache_for(mode)
+    key = cache_key(system_prompt, user_prompt, backend.route if backend else "")
+    if cache and (hit := cache.get(key)) is not None:
+        return hit
+
+    if not backend:
         print("LLM not initialized")
         return None
 
+    guard = guard_for(backend)
+    if not guard.breaker.allow():
+        return None
+
     try:
-        response = _client.models.generate_content(
-            model="gemini-2.5-flash",  # ✅ working current model
-            contents=f"{system_prompt}\n\nUser: {user_prompt}"
-        )
+        if COALESCE_ENABLED:
+            text = flights.do_sync(key, lambda: guard.generate_sync(system_prompt, user_prompt))
+        else:
+            text = guard.generate_sync(system_prompt, user_prompt)
+        if cache and text is not None:
+            cache.put(key, text)
+        return text
 
-        if response.text:
-            return response.text.strip()
+    except Exception as e:
+        print("GEMINI CALL FAILED:", repr(e))
+        return None
+
+async def ask_gemini_async(system_prompt: str, user_prompt: str, mode: Optional[str] = None) -> Optional[str]:
+    """
+    Same contract as ask_gemini (text or None -> caller uses its fallback),
+    but awaits the pooled async client instead of pinning a threadpool worker.
+
+    `mode` picks the backend route, the cache policy and the deadline. The key
+    includes the system prompt, so a FINAL-locked turn (sent with the socratic
+    prompt) can never hit a FINAL entry. While the route's circuit is open this
+    returns None straight away.
+    """
+    backend = backend_for(mode)
+    cache = _cache_for(mode)
+    key = cache_key(system_prompt, user_prompt, backend.route if backend else "")
+    if cache and (hit := cache.get(key)) is not None:
+        return hit
+
+    if not backend:
+        print("LLM not initialized")
+        return None
 
-        print("No text returned:", response)
+    guard = guard_for(backend)
+    if not guard.breaker.allow():
         return None
 
+    try:
+        if COALESCE_ENABLED:
+            text = await flights.do_async(key, lambda: guard.generate(system_prompt, user_prompt, mode))
+        else:
+            text = await guard.generate(system_prompt, user_prompt, mode)
+        if cache and text is not None:
+            cache.put(key, text)
+        return text
+
     except Exception as e:
         print("GEMINI CALL FAILED:", repr(e))
-        return None
\ No newline at end of file
+        return None
+
+async def shared_reply(system_prompt: str, user_prompt: str, mode: Optional[str] = None) -> Optional[str]:
+    """
+    A reply that needs no LLM call of its own: a cache hit, or the result of an
+    identical call already in flight. None otherwise. Callers check this before
+    admission, so such turns take no rate tokens or gate slots.
+    """
+    backend = backend_for(mode)
+    cache = _cache_for(mode)
+    key = cache_key(system_prompt, user_prompt, backend.route if backend else "")
+    if cache and (hit := cache.get(key)) is not None:
+        return hit
+    if COALESCE_ENABLED and backend:
+        return await flights.join_async(key)
+    return None
+
+async def aclose() -> None:
+    """Release pooled connections (called on app shutdown)."""
+    for backend in _backends.values():
+        if backend:
+            await backend.aclose()
+
+class StreamFailed(Exception):
+    """The stream broke after some chunks were yielded: what the caller has is a partial reply."""
+
+async def stream_gemini(system_prompt: str, user_prompt: str, mode: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Yields reply text chunks as the backend generates them (a cache hit is one chunk).
+    Yields nothing if the LLM is unavailable, so callers can fall back the same way.
+    Raises StreamFailed if it breaks after the first chunk; the chunks so far must be discarded.
+    """
+    backend = backend_for(mode)
+    cache = _cache_for(mode)
+    key = cache_key(system_prompt, user_prompt, backend.route if backend else "")
+    if cache and (hit := cache.get(key)) is not None:
+        yield hit
+        return
+
+    if not backend:
+        print("LLM not initialized")
+        return
+
+    guard = guard_for(backend)
+    if not guard.breaker.allow():
+        return
+
+    parts: List[str] = []
+    chunks = backend.stream(system_prompt, user_prompt)
+    try:
+        try:
+            first = await guard.stream_first(chunks, mode)  # mode deadline for the first token
+        except StopAsyncIteration:
+            return
+
+        parts.append(first)
+        yield first
+        while True:
+            try:
+                chunk = await guard.stream_next(chunks)  # then a deadline between chunks
+            except StopAsyncIteration:
+                break
+            parts.append(chunk)
+            yield chunk
+
+        text = "".join(parts).strip()
+        if cache and text:
+            cache.put(key, text)
+
+    except Exception as e:
+        print("GEMINI STREAM FAILED:", repr(e))
+        if parts:
+            raise StreamFailed(repr(e)) from e
+    finally:
+        await chunks.aclose()  # also when the consumer stops early: release the connection
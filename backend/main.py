@@ -1,22 +1,56 @@
-from fastapi import FastAPI
-from pydantic import BaseModel, Field
-from llm_client import ask_gemini
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from fastapi import FastAPI, Header, HTTPException, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+import llm_client
+from llm_client import StreamFailed, ask_gemini_async, stream_gemini
 from prompts import socratic_prompt, hint_prompt, final_prompt, reflection_prompt
+from context_builder import build_user_prompt
+import near_dup
+from response_cache import normalize_user_text
 from typing import Literal, Optional, Dict, Any, List
 
-from session_store import store, Session, Message
-from task_detect import detect_task_type
+from session_store import store, Session
+from task_detect import detect_task_type, reload_vocab
+import profiling
+from profiling import ProfilingMiddleware
+from telemetry import registry, stage, detach_request_timings, TimingMiddleware, LLM_CALLS, FALLBACKS, FINAL_LOCKS, SHED
+from admission import admission, priority_for, BATCH, SPECULATIVE
+import speculation
+from speculation import speculator
+import ws_channel
+from ws_channel import open_channel, ChannelClosed
 
 from metrics import (
     EffortMetrics,
     compute_effort_score,
-    skill_tags,
+    scan_text,
     generate_summary,
+    compute_effort_scores_batch,
+    DraftScorer,
+    reasons_from_mask,
+    REASON_BITS,
+    STATES,
 )
 
 Mode = Literal["SOCRATIC", "HINT", "FINAL", "REFLECTION", "SUMMARY"]
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    profiling.start_tracemalloc()
+    near_dup.load_persisted()
+    warming = asyncio.create_task(warmup())
+    yield
+    warming.cancel()
+    await llm_client.aclose()
+    store.close()
+    near_dup.save_persisted()
+
+app = FastAPI(lifespan=lifespan)
 
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -26,12 +60,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id"],
 )
+app.add_middleware(TimingMiddleware)
+app.add_middleware(ProfilingMiddleware)
 
 @app.get("/")
 def home():
     return {"message": "COOKED backend running 🍗🧠"}
 
+WARM = False
+WARMUP_TEXT = "Step 1: I think the integral of x e^x needs parts, because u = x -> du = dx. Then?"
+
+async def warmup() -> None:
+    """
+    Runs once at startup, in the background: pays the first-call costs of the
+    turn pipeline (task vocab load, scanner/regex paths, summary) and opens the
+    LLM connections, so the first real turn doesn't. /readyz reports it.
+    """
+    global WARM
+    features = scan_text(WARMUP_TEXT)
+    compute_effort_score(WARMUP_TEXT, EffortMetrics(120, 30000, 10, 2, 0, 0), sp=features.structure)
+    detect_task_type(WARMUP_TEXT)
+    generate_summary([{"mode": "SOCRATIC", "score": 50, "unlocked": False, "tags": features.tags}])
+    await llm_client.warmup()
+    WARM = True
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving."""
+    return {"ok": True}
+
+@app.get("/readyz")
+async def readyz():
+    """
+    Readiness: warmup finished and every LLM route is reachable or has its
+    circuit open (turns get the fallback replies either way). A route without
+    credentials ("not_configured") serves fallbacks and doesn't block readiness.
+    """
+    llm = await llm_client.readiness() if WARM else {}
+    ready = WARM and all(state != "unreachable" for state in llm.values())
+    return JSONResponse({"ready": ready, "warm": WARM, "llm": llm}, status_code=200 if ready else 503)
+
 class MetricsIn(BaseModel):
     chars_typed: int = 0
     time_spent_ms: int = 0
@@ -56,6 +126,9 @@ class ChatResponse(BaseModel):
     task_type: Literal["math","writing","explain"]
     banner: str
     summary: Optional[Dict[str, Any]] = None
+    # set when assistant_text is the canned fallback, not an LLM reply: the shed reason
+    # (session_rate / global_rate / batch_rate / saturated) or "llm_error"
+    fallback: Optional[str] = None
 
 def banner_from_state(state: str, unlocked: bool) -> str:
     if unlocked:
@@ -84,16 +157,47 @@ def final_locked_msg() -> str:
 def reflection_fallback() -> str:
     return "Reflection: (1) What was the key step? (2) What would you try first next time? (3) What mistake will you avoid?"
 
-@app.post("/chat", response_model=ChatResponse)
-def chat(req: ChatRequest):
+SUMMARY_TEXT = "Here’s your Summary, you may not be cooked after all."
+
+PROMPTS = {
+    "SOCRATIC": socratic_prompt,
+    "HINT": hint_prompt,
+    "FINAL": final_prompt,
+    "REFLECTION": reflection_prompt,
+}
+
+def llm_fallback(mode: str, task_type: str, locked: bool) -> str:
+    if mode == "SOCRATIC":
+        return final_locked_msg() if locked else socratic_fallback(task_type)
+    if mode == "HINT":
+        return hint_fallback(task_type)
+    if mode == "FINAL":
+        return "Final answer unlocked, but AI unavailable. (Fallback active)"
+    return reflection_fallback()
+
+@dataclass
+class Turn:
+    session: Session
+    task_type: str
+    score: int
+    state: str
+    reasons: List[str]
+    tags: List[str]
+    effective_mode: str
+    locked: bool
+    priority: int  # admission priority of this turn's LLM call
+
+def begin_turn(req: ChatRequest) -> Turn:
+    """Everything in a /chat turn that happens before the LLM call."""
     s: Session = store.get(req.session_id)
 
     # N/A set task type once per session
-    task_type = detect_task_type(req.user_text)
+    with stage("task_detect"):
+        task_type = detect_task_type(req.user_text)
     s.task_type = task_type  # keep latest for display if you want
 
     # update question history
-    s.question_history.append(req.user_text)
+    s.add_question(req.user_text)
 
     # convert request metrics -> EffortMetrics (dataclass from your metrics.py)
     m = EffortMetrics(
@@ -105,18 +209,23 @@ def chat(req: ChatRequest):
         final_request_count=req.metrics.final_request_count,
     )
 
+    # one scan of the text gives both structure points and skill tags
+    with stage("scan"):
+        features = scan_text(req.user_text)
+
     # compute effort score using your function
-    score, state, unlocked_now, reasons = compute_effort_score(req.user_text, m)
+    with stage("score"):
+        score, state, unlocked_now, reasons = compute_effort_score(req.user_text, m, sp=features.structure)
 
     # update session unlock state
     if unlocked_now:
         s.final_unlocked = True
 
     # compute tags
-    tags = skill_tags(req.user_text)
+    tags = features.tags
 
     # append chat history
-    s.history.append(Message(role="user", content=req.user_text))
+    s.add_message("user", req.user_text)
 
     # enforce FINAL lock
     effective_mode: Mode = req.mode
@@ -124,55 +233,551 @@ def chat(req: ChatRequest):
     if req.mode == "FINAL" and not s.final_unlocked:
         effective_mode = "SOCRATIC"
         locked = True
+        FINAL_LOCKS.inc()
+
+    priority = priority_for(effective_mode, s.turns.last_mode())
+    return Turn(s, task_type, score, state, reasons, tags, effective_mode, locked, priority)
+
+def finish_turn(turn: Turn, req: ChatRequest) -> Optional[Dict[str, Any]]:
+    """Log this turn (for summary generator) and build the SUMMARY payload."""
+    s = turn.session
+    with stage("store"):
+        s.add_turn(req.mode, turn.score, s.final_unlocked, turn.tags)
+        store.save(s)
+    if req.mode != "SUMMARY":
+        return None
+    with stage("summary"):
+        return generate_summary(s.stats)
+
+def turn_fields(turn: Turn) -> Dict[str, Any]:
+    """ChatResponse fields that are known before the LLM answers."""
+    s = turn.session
+    return {
+        "score": turn.score,
+        "state": turn.state,   # RAW/SIZZLING/COOKED
+        "unlocked": s.final_unlocked,
+        "reasons": turn.reasons,
+        "tags": turn.tags,
+        "task_type": turn.task_type,  # math/writing/explain
+        "banner": banner_from_state(turn.state, s.final_unlocked),
+    }
+
+def asked_before(s: Session, user_text: str) -> bool:
+    # question_history[-1] is this turn's question
+    q = normalize_user_text(user_text)
+    return any(normalize_user_text(p) == q for p in list(s.question_history)[:-1])
+
+def reuse_reply(turn: Turn, req: ChatRequest, user_prompt: str) -> Optional[str]:
+    """A stored reply to an equivalent earlier question, unless this student is asking again."""
+    if not near_dup.ENABLED or turn.effective_mode not in near_dup.REUSE_MODES:
+        return None
+    if user_prompt != req.user_text:
+        return None  # stored replies had no conversation context; this turn has some
+    if asked_before(turn.session, req.user_text):
+        return None  # same student repeating themselves wants a fresh reply
+    with stage("near_dup"):
+        return near_dup.index.lookup(turn.task_type, turn.effective_mode, req.user_text)
+
+def remember_reply(turn: Turn, req: ChatRequest, user_prompt: str, reply: str) -> None:
+    # only replies to the bare question (no conversation context) are safe to reuse elsewhere
+    if near_dup.ENABLED and turn.effective_mode in near_dup.REUSE_MODES and user_prompt == req.user_text:
+        near_dup.index.add(turn.task_type, turn.effective_mode, req.user_text, reply)
+
+async def speculated_reply(turn: Turn, req: ChatRequest) -> Optional[str]:
+    """The reply prefetched after the previous turn, if this turn is the one it guessed."""
+    if not speculation.ENABLED:
+        return None
+    with stage("speculation"):
+        return await speculator.take(req.session_id, turn.effective_mode, req.user_text, turn.session.msg_total)
+
+def speculate(turn: Turn, req: ChatRequest, user_prompt: str) -> None:
+    """
+    After a real reply: prefetch the one this session most likely asks for next, on idle capacity.
+    `user_prompt` is this turn's, built before the reply was appended; the background call
+    uses that value and never reads or folds the session itself.
+    """
+    if not speculation.ENABLED:
+        return
+    s = turn.session
+    mode = speculation.predict(turn.effective_mode, s.final_unlocked)
+    if mode not in speculation.MODES:
+        return
+    prompt = PROMPTS[mode](turn.task_type)
+
+    async def generate() -> Optional[str]:
+        shared = await llm_client.shared_reply(prompt, user_prompt, mode=mode)
+        if shared is not None:
+            return shared
+        async with admission.admit(req.session_id, SPECULATIVE) as shed:
+            if shed:
+                return None
+            return await ask_gemini_async(prompt, user_prompt, mode=mode)
+
+    speculator.start(req.session_id, mode, req.user_text, s.msg_total, generate)
+
+def count_llm_call(mode: str, ok: bool) -> None:
+    LLM_CALLS.inc(mode=mode, outcome="ok" if ok else "fallback")
+    if not ok:
+        FALLBACKS.inc(mode=mode)
+
+def count_shed(mode: str, reason: str) -> None:
+    SHED.inc(reason=reason)
+    FALLBACKS.inc(mode=mode)
+
+async def run_turn(req: ChatRequest, batch: bool = False) -> ChatResponse:
+    turn = begin_turn(req)
+    if batch:
+        turn.priority = BATCH
 
     # LLM assistant response
-    assistant_text = None
-
-    if effective_mode == "SOCRATIC":
-        assistant_text = ask_gemini(socratic_prompt(task_type), req.user_text)
+    fallback_reason = None
+    if turn.effective_mode == "SUMMARY":
+        assistant_text = SUMMARY_TEXT
+    else:
+        prompt = PROMPTS[turn.effective_mode](turn.task_type)
+        with stage("context"):
+            user_prompt = build_user_prompt(turn.session, req.user_text)
+        assistant_text = reuse_reply(turn, req, user_prompt)
+        if assistant_text is None and not batch:
+            assistant_text = await speculated_reply(turn, req)
         if assistant_text is None:
-            assistant_text = f"(FALLBACK) task={task_type} locked={locked}"
-
-    elif effective_mode == "HINT":
-        assistant_text = ask_gemini(hint_prompt(task_type), req.user_text)
+            with stage("llm_shared"):
+                # cached, or an identical call in flight: no tokens or gate slot needed
+                assistant_text = await llm_client.shared_reply(prompt, user_prompt, mode=turn.effective_mode)
+            if assistant_text is not None:
+                count_llm_call(turn.effective_mode, True)
         if assistant_text is None:
-            assistant_text = hint_fallback(task_type)
-
-    elif effective_mode == "FINAL":
-        assistant_text = ask_gemini(final_prompt(task_type), req.user_text)
+            async with admission.admit(req.session_id, turn.priority) as shed:
+                if shed:
+                    count_shed(turn.effective_mode, shed)  # answer now with the fallback, don't queue
+                    fallback_reason = shed
+                else:
+                    with stage("llm"):
+                        assistant_text = await ask_gemini_async(prompt, user_prompt, mode=turn.effective_mode)
+                    count_llm_call(turn.effective_mode, assistant_text is not None)
+            if assistant_text is not None:
+                remember_reply(turn, req, user_prompt, assistant_text)
         if assistant_text is None:
-            assistant_text = "Final answer unlocked, but AI unavailable. (Fallback active)"
+            assistant_text = llm_fallback(turn.effective_mode, turn.task_type, turn.locked)
+            fallback_reason = fallback_reason or "llm_error"
+        else:
+            turn.session.add_message("assistant", assistant_text)
+            if not batch:
+                speculate(turn, req, user_prompt)
 
-    elif effective_mode == "REFLECTION":
-        assistant_text = ask_gemini(reflection_prompt(task_type), req.user_text)
-        if assistant_text is None:
-            assistant_text = reflection_fallback()
+    summary_payload = finish_turn(turn, req)
+
+    return ChatResponse(
+        assistant_text=assistant_text,
+        summary=summary_payload,
+        fallback=fallback_reason,
+        **turn_fields(turn),
+    )
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    return await run_turn(req)
+
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX", "5000"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "32"))
+
+@app.post("/chat/batch")
+async def chat_batch(reqs: List[ChatRequest]):
+    """
+    Runs many /chat turns in one request, streamed back as NDJSON in completion order:
+      {"index": 3, "response": {...ChatResponse}}   or   {"index": 3, "error": "..."}
+    Turns of one session run in array order (unlock state and turn logs stay
+    correct); different sessions run concurrently, at most CHAT_BATCH_CONCURRENCY at a time.
+    """
+    if len(reqs) > CHAT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"at most {CHAT_BATCH_MAX} turns per batch")
+
+    by_session: Dict[str, List[int]] = {}
+    for i, r in enumerate(reqs):
+        by_session.setdefault(r.session_id, []).append(i)
+
+    gate = asyncio.Semaphore(CHAT_BATCH_CONCURRENCY)
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def run_session(indices: List[int]) -> None:
+        detach_request_timings()  # thousands of turns would bloat this request's Server-Timing list
+        for i in indices:
+            try:
+                async with gate:
+                    resp = await run_turn(reqs[i], batch=True)
+                line = {"index": i, "response": resp.model_dump()}
+            except Exception as e:
+                print("BATCH TURN FAILED:", i, repr(e))
+                line = {"index": i, "error": repr(e)}
+            await results.put(json.dumps(line, ensure_ascii=False) + "\n")
+
+    async def lines():
+        tasks = [asyncio.create_task(run_session(ix)) for ix in by_session.values()]
+        try:
+            for _ in range(len(reqs)):
+                yield await results.get()
+        finally:
+            for t in tasks:  # client went away: stop the remaining turns
+                t.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def turn_events(turn: Turn, req: ChatRequest, summary_payload: Optional[Dict[str, Any]]):
+    """
+    The streamed form of a turn, shared by /chat/stream and /ws:
+      ("score", turn_fields)  before any LLM call
+      ("token", {"text": ...}) chunks of the assistant reply
+      ("reset", {"reason": ...}) the LLM stream broke mid-reply: drop the tokens so far
+                               (the fallback reply follows as tokens)
+      ("done", ChatResponse)  assistant_text + summary included
+    """
+    yield "score", turn_fields(turn)
+
+    fallback_reason = None
+    if turn.effective_mode == "SUMMARY":
+        parts = [SUMMARY_TEXT]
+        yield "token", {"text": SUMMARY_TEXT}
+    else:
+        parts = []
+        prompt = PROMPTS[turn.effective_mode](turn.task_type)
+        with stage("context"):
+            user_prompt = build_user_prompt(turn.session, req.user_text)
+        reused = reuse_reply(turn, req, user_prompt)
+        if reused is None:
+            reused = await speculated_reply(turn, req)
+        if reused is None:
+            with stage("llm_shared"):
+                # cached, or an identical call in flight: no tokens or gate slot needed
+                reused = await llm_client.shared_reply(prompt, user_prompt, mode=turn.effective_mode)
+            if reused is not None:
+                count_llm_call(turn.effective_mode, True)
+        if reused is not None:
+            parts.append(reused)
+            yield "token", {"text": reused}
+        else:
+            async with admission.admit(req.session_id, turn.priority) as shed:
+                if shed:
+                    count_shed(turn.effective_mode, shed)
+                    fallback_reason = shed
+                else:
+                    with stage("llm"):
+                        try:
+                            async for chunk in stream_gemini(prompt, user_prompt, mode=turn.effective_mode):
+                                parts.append(chunk)
+                                yield "token", {"text": chunk}
+                        except StreamFailed:
+                            # a truncated reply is not a reply: don't store, reuse or build on it
+                            parts.clear()
+                            yield "reset", {"reason": "llm_error"}
+                    count_llm_call(turn.effective_mode, bool(parts))
+            if parts:
+                remember_reply(turn, req, user_prompt, "".join(parts).strip())
+
+        if parts:
+            turn.session.add_message("assistant", "".join(parts).strip())
+            store.save(turn.session)
+            if turn.effective_mode != "SUMMARY":
+                speculate(turn, req, user_prompt)
+        else:
+            fallback = llm_fallback(turn.effective_mode, turn.task_type, turn.locked)
+            fallback_reason = fallback_reason or "llm_error"
+            parts.append(fallback)
+            yield "token", {"text": fallback}
+
+    done = ChatResponse(
+        assistant_text="".join(parts).strip(),
+        summary=summary_payload,
+        fallback=fallback_reason,
+        **turn_fields(turn),
+    )
+    yield "done", done.model_dump()
+
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Same turn as /chat, sent as Server-Sent Events:
+      event: score  -> score/state/unlocked/reasons/tags/task_type/banner (before any LLM call)
+      event: token  -> {"text": ...} chunks of the assistant reply
+      event: reset  -> {"reason": ...} the reply broke off: discard the tokens so far
+      event: done   -> full ChatResponse (assistant_text + summary included)
+    """
+    turn = begin_turn(req)
+    summary_payload = finish_turn(turn, req)
+
+    async def events():
+        async for event, data in turn_events(turn, req, summary_payload):
+            yield sse(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    else:  # SUMMARY
-        assistant_text = "Here’s your Summary, you may not be cooked after all."
+WS_METER_INTERVAL_S = float(os.getenv("WS_METER_INTERVAL_S", "0.25"))
+WS_HISTORY = int(os.getenv("WS_HISTORY", "50"))
+WS_MAX_DRAFT_CHARS = int(os.getenv("WS_MAX_DRAFT_CHARS", "20000"))
+if WS_MAX_DRAFT_CHARS * 6 + 4096 > ws_channel.MAX_MESSAGE_BYTES:
+    print("WS_MAX_MESSAGE_BYTES is too small for a full WS_MAX_DRAFT_CHARS resync frame")
 
+class DraftEdit(BaseModel):
+    at: int
+    delete: int = 0
+    insert: str = ""
 
-    # log this turn (for summary generator)
-    s.turns.append({
-        "mode": req.mode,
+class TypingIn(BaseModel):
+    text: Optional[str] = None          # whole draft (first message, or to resync)
+    edits: List[DraftEdit] = Field(default_factory=list)   # then just the keystrokes
+    metrics: MetricsIn = Field(default_factory=MetricsIn)
+
+def apply_typing(draft: DraftScorer, msg: TypingIn) -> Optional[str]:
+    """Apply a typing message to the connection's draft; an error detail if it can't be."""
+    try:
+        if msg.text is not None:
+            draft.replace(0, len(draft), msg.text)
+        for e in msg.edits:
+            draft.replace(e.at, e.at + e.delete, e.insert)
+    except ValueError:
+        draft.clear()
+        return "draft out of sync, send the full text"
+    if len(draft) > WS_MAX_DRAFT_CHARS:
+        draft.clear()
+        return f"draft longer than {WS_MAX_DRAFT_CHARS} chars"
+    return None
+
+def draft_meter(s: Session, draft: DraftScorer, m: MetricsIn) -> Dict[str, Any]:
+    """Meter fields for an unsent draft. Scoring only: the session isn't touched."""
+    metrics = EffortMetrics(m.chars_typed, m.time_spent_ms, m.backspaces,
+                            m.attempt_count, m.hint_count, m.final_request_count)
+    score, state, _, reasons = draft.score(metrics)
+    return {
         "score": score,
+        "state": state,
+        "unlocked": s.final_unlocked,
+        "reasons": reasons,
+        "banner": banner_from_state(state, s.final_unlocked),
+    }
+
+def session_snapshot(s: Session) -> Dict[str, Any]:
+    """What a (re)connecting client needs to redraw: recent messages and the last meter reading."""
+    last = s.turns.record(len(s.turns) - 1) if len(s.turns) else None
+    return {
+        "messages": [{"role": m.role, "content": m.content} for m in list(s.history)[-WS_HISTORY:]],
+        "score": last["score"] if last else 0,
         "unlocked": s.final_unlocked,
-        "tags": tags,
-    })
+        "task_type": s.task_type,
+    }
+
+@app.websocket("/ws/{session_id}")
+async def ws_session(ws: WebSocket, session_id: str):
+    """
+    One long-lived connection per open tab. JSON text frames both ways.
+
+    client -> server
+      {"type": "typing", "text": draft, "metrics": {...}}   live draft, scored incrementally
+      {"type": "typing", "edits": [{"at", "delete", "insert"}], "metrics": {...}}
+      {"type": "chat", "mode": ..., "user_text": ..., "metrics": {...}}
+      {"type": "ping"} / {"type": "pong"}
+    server -> client
+      {"type": "hello", messages, score, unlocked, task_type}          on connect
+      {"type": "meter", score, state, unlocked, reasons, banner}       draft score changed
+      {"type": "score" | "token" | "reset" | "done", ...}              same as /chat/stream events
+      {"type": "ping"} / {"type": "pong"} / {"type": "error", "detail": ...}
+
+    One chat turn at a time per connection. Typing updates are scored at most
+    every WS_METER_INTERVAL_S and only the newest draft counts.
+    """
+    async with open_channel(ws) as ch:
+        await ch.send({"type": "hello", **session_snapshot(store.get(session_id))})
+
+        draft = DraftScorer()
+        draft_metrics: List[MetricsIn] = [MetricsIn()]   # counters sent with the newest edit
+        draft_ready = asyncio.Event()
+        turn_task: Optional[asyncio.Task] = None
+
+        async def meter_loop() -> None:
+            last = None
+            while True:
+                await draft_ready.wait()
+                draft_ready.clear()
+                with stage("meter"):
+                    fields = draft_meter(store.get(session_id), draft, draft_metrics[0])
+                if fields != last:
+                    ch.offer({"type": "meter", **fields})
+                    last = fields
+                await asyncio.sleep(WS_METER_INTERVAL_S)
+
+        async def chat_turn(req: ChatRequest) -> None:
+            try:
+                turn = begin_turn(req)
+                summary_payload = finish_turn(turn, req)
+                async for event, data in turn_events(turn, req, summary_payload):
+                    await ch.send({"type": event, **data})
+            except ChannelClosed:
+                pass
+            except Exception as e:
+                print("WS TURN FAILED:", repr(e))
+                ch.offer({"type": "error", "detail": "turn failed"})
+
+        ch.spawn(meter_loop())
+        while True:
+            msg = await ch.receive()
+            kind = msg.get("type")
+            try:
+                if kind == "ping":
+                    ch.offer({"type": "pong"})
+                elif kind == "pong":
+                    pass
+                elif kind == "typing":
+                    typing = TypingIn.model_validate(msg)
+                    error = apply_typing(draft, typing)
+                    if error:
+                        ch.offer({"type": "error", "detail": error})
+                        continue
+                    draft_metrics[0] = typing.metrics
+                    draft_ready.set()
+                elif kind == "chat":
+                    req = ChatRequest.model_validate({**msg, "session_id": session_id})
+                    if turn_task is not None and not turn_task.done():
+                        ch.offer({"type": "error", "detail": "a turn is already in progress"})
+                        continue
+                    draft.clear()  # the draft was sent; the next keystroke starts a new one
+                    turn_task = ch.spawn(chat_turn(req))
+                else:
+                    ch.offer({"type": "error", "detail": f"unknown message type: {kind!r}"})
+            except ValidationError as e:
+                ch.offer({"type": "error", "detail": e.errors(include_url=False, include_input=False)})
+
+@app.get("/store")
+def store_stats():
+    return store.stats()
+
+# gauges read at scrape time, so /chat never pays for them
+registry.gauge("cooked_store_sessions", "Sessions held by the session store.",
+               lambda: {(): store.stats()["sessions"]})
+registry.gauge("cooked_store_bytes", "Approximate bytes held by the session store.",
+               lambda: {(): store.stats()["approx_bytes"]})
+registry.gauge("cooked_llm_cache_entries", "LLM response cache entries by policy.",
+               lambda: {(("policy", m),): c["entries"] for m, c in llm_client.cache_stats().items()})
+registry.gauge("cooked_llm_in_flight", "LLM calls holding an admission slot.",
+               lambda: {(): admission.gate.active})
+registry.gauge("cooked_llm_waiting", "Turns waiting for an admission slot.",
+               lambda: {(): admission.gate.waiting})
+registry.gauge("cooked_near_dup_hits", "LLM calls avoided by reusing a near-duplicate question's reply.",
+               lambda: {(): near_dup.index.stats()["hits"]})
+registry.gauge("cooked_ws_connections", "Open /ws session connections.",
+               lambda: {(): ws_channel.stats["open"]})
+registry.gauge("cooked_speculation", "Speculative next-reply prefetches by outcome (running totals).",
+               lambda: {(("outcome", k),): v for k, v in speculator.counts.items()})
+registry.gauge("cooked_llm_circuit_open", "1 while a backend route's circuit breaker is open.",
+               lambda: {(("route", r),): float(h["state"] == "open") for r, h in llm_client.health_stats().items()})
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+class ScoreBatchRequest(BaseModel):
+    """Columnar EffortMetrics; give either per-row `structure` points or the raw `texts`."""
+    chars_typed: List[int]
+    time_spent_ms: List[int]
+    backspaces: List[int]
+    attempt_count: List[int]
+    hint_count: List[int]
+    final_request_count: List[int]
+    structure: Optional[List[float]] = None
+    texts: Optional[List[str]] = None
+    include_reasons: bool = False
+
+class ScoreBatchResponse(BaseModel):
+    score: List[int]
+    state: List[Literal["RAW","SIZZLING","COOKED"]]
+    unlocked: List[bool]
+    reasons_mask: List[int]
+    reliance: List[float]
+    reason_bits: List[str]
+    reasons: Optional[List[List[str]]] = None
+
+@app.post("/score/batch", response_model=ScoreBatchResponse)
+def score_batch(req: ScoreBatchRequest):
+    n = len(req.chars_typed)
+    columns = [req.time_spent_ms, req.backspaces, req.attempt_count, req.hint_count, req.final_request_count]
+    if any(len(col) != n for col in columns):
+        raise HTTPException(status_code=422, detail="all metric columns must have the same length")
+
+    if req.structure is not None:
+        structure = req.structure
+    elif req.texts is not None:
+        structure = [scan_text(t).structure for t in req.texts]
+    else:
+        raise HTTPException(status_code=422, detail="send either structure or texts")
+    if len(structure) != n:
+        raise HTTPException(status_code=422, detail="structure/texts must match the metric columns")
+
+    out = compute_effort_scores_batch(req.chars_typed, *columns, structure)
+    masks = out["reasons_mask"].tolist()
+    return ScoreBatchResponse(
+        score=out["score"].tolist(),
+        state=[STATES[i] for i in out["state"].tolist()],
+        unlocked=out["unlocked"].tolist(),
+        reasons_mask=masks,
+        reliance=out["reliance"].tolist(),
+        reason_bits=REASON_BITS,
+        reasons=[reasons_from_mask(mk) for mk in masks] if req.include_reasons else None,
+    )
 
-    summary_payload = generate_summary(s.turns) if req.mode == "SUMMARY" else None
+@app.post("/task_vocab/reload")
+def task_vocab_reload():
+    return {"reloaded": reload_vocab(force=True)}
 
-    return ChatResponse(
-        assistant_text=assistant_text,
-        score=score,
-        state=state,   # RAW/SIZZLING/COOKED
-        unlocked=s.final_unlocked,
-        reasons=reasons,
-        tags=tags,
-        task_type=task_type,  # math/writing/explain
-        banner=banner_from_state(state, s.final_unlocked),
-        summary=summary_payload
-    )
+@app.get("/llm_cache")
+def llm_cache():
+    return llm_client.cache_stats()
+
+@app.get("/llm_coalesce")
+def llm_coalesce():
+    return llm_client.coalesce_stats()
+
+@app.get("/llm_routes")
+def llm_routes():
+    return llm_client.routes()
+
+@app.get("/llm_health")
+def llm_health():
+    return llm_client.health_stats()
+
+@app.get("/admission")
+def admission_stats():
+    return admission.stats()
+
+@app.get("/ws_stats")
+def ws_stats():
+    return dict(ws_channel.stats)
+
+@app.get("/speculation")
+def speculation_stats():
+    return speculator.stats()
+
+@app.get("/near_dup")
+def near_dup_stats():
+    return near_dup.index.stats()
+
+def require_admin(token: Optional[str]) -> None:
+    if not profiling.is_admin(token):
+        raise HTTPException(status_code=403, detail="X-Admin-Token required (set ADMIN_TOKEN)")
+
+@app.get("/debug/memory")
+def debug_memory(top: int = 20, start: bool = False, x_admin_token: Optional[str] = Header(None)):
+    """tracemalloc top allocators (+ growth since the last call) and where the session store's bytes go."""
+    require_admin(x_admin_token)
+    return {"tracemalloc": profiling.memory_report(top, start), "store": store.breakdown(top)}
+
+@app.get("/debug/profiles")
+def debug_profiles(x_admin_token: Optional[str] = Header(None)):
+    require_admin(x_admin_token)
+    return profiling.profile_stats()
 
 @app.get("/llm_test")
 def llm_test():
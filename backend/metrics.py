@@ -3,7 +3,19 @@ from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
 import math
 import re
-from statistics import mean
+
+# numpy is only for batch scoring, so it's imported on first use (keeps `import main` fast)
+np = None
+
+def _load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except Exception:
+            return None
+        np = numpy
+    return np
 
 # ---------------------------
 # Data model
@@ -34,19 +46,26 @@ def structure_points(text: str) -> float:
     """
     if not text:
         return 0.0
+    # these three regexes are already linear; chat() gets the same value from scan_text()
+    return _structure_points_re(text[:MAX_SCAN_CHARS])
+
+_SENTENCE_END_RE = re.compile(r"[.!?]+")
+_CONNECTOR_RE = re.compile(r"\b(because|so|therefore|thus|however|if|then|since)\b", re.I)
+_STEP_RE = re.compile(r"(\n-|\n\d+\.|\bstep\b|=|->)", re.I)
 
+def _structure_points_re(text: str) -> float:
     pts = 0.0
 
     # multiple sentences
-    if len(re.split(r"[.!?]+", text)) >= 3:
+    if len(_SENTENCE_END_RE.split(text)) >= 3:
         pts += 3
 
     # reasoning connectors
-    if re.search(r"\b(because|so|therefore|thus|however|if|then|since)\b", text, re.I):
+    if _CONNECTOR_RE.search(text):
         pts += 3
 
     # steps/bullets/equations
-    if re.search(r"(\n-|\n\d+\.|\bstep\b|=|->)", text, re.I):
+    if _STEP_RE.search(text):
         pts += 4
 
     return clamp(pts, 0, 10)
@@ -55,7 +74,8 @@ def structure_points(text: str) -> float:
 # Effort scoring
 # ---------------------------
 
-def compute_effort_score(user_text: str, m: EffortMetrics) -> Tuple[int, str, bool, List[str]]:
+def compute_effort_score(user_text: str, m: EffortMetrics, sp: Optional[float] = None) -> Tuple[int, str, bool, List[str]]:
+    """`sp` lets callers pass structure points they already got from scan_text()."""
     reasons: List[str] = []
 
     # 1) Length (0–40): saturates after ~600 chars
@@ -82,7 +102,8 @@ def compute_effort_score(user_text: str, m: EffortMetrics) -> Tuple[int, str, bo
         reasons.append("Active editing")
 
     # 5) Structure (0–10)
-    sp = structure_points(user_text)
+    if sp is None:
+        sp = structure_points(user_text)
     if sp >= 6:
         reasons.append("Reasoning structure detected")
 
@@ -133,6 +154,120 @@ def reliance_index(m: EffortMetrics) -> float:
     attempts = clamp(1 - (min(m.attempt_count, 4) / 4), 0, 1)
     return round(0.45 * final + 0.35 * hint + 0.20 * attempts, 2)
 
+# ---------------------------
+# Batch scoring (NumPy)
+# ---------------------------
+
+# bit i of reasons_mask <-> REASON_BITS[i]; same order compute_effort_score appends them
+REASON_BITS = [
+    "Good attempt length",
+    "Time invested",
+    "Iterated on attempt",
+    "Active editing",
+    "Reasoning structure detected",
+    "Hint penalty applied",
+    "Early FINAL request penalty",
+    "Anti-cheese cap applied",
+]
+STATES = ["RAW", "SIZZLING", "COOKED"]
+
+def reasons_from_mask(mask: int) -> List[str]:
+    return [r for i, r in enumerate(REASON_BITS) if mask >> i & 1]
+
+# reliance_index only depends on clipped counts, so the batch version is a table lookup
+_RELIANCE_TABLE = None
+
+def _reliance_table():
+    global _RELIANCE_TABLE
+    if _RELIANCE_TABLE is None:
+        _RELIANCE_TABLE = np.array([
+            [[reliance_index(EffortMetrics(0, 0, 0, a, h, f)) for a in range(5)] for f in range(4)]
+            for h in range(6)
+        ])
+    return _RELIANCE_TABLE
+
+def compute_effort_scores_batch(
+    chars_typed,
+    time_spent_ms,
+    backspaces,
+    attempt_count,
+    hint_count,
+    final_request_count,
+    structure,
+) -> Dict[str, "np.ndarray"]:
+    """
+    Vectorized compute_effort_score + reliance_index over columnar arrays
+    (one row per logged turn; `structure` is structure_points() per row).
+
+    Returns arrays: score (int), state (index into STATES), unlocked (bool),
+    reasons_mask (bits of REASON_BITS), reliance (float). Row-for-row identical
+    to the scalar functions: rows whose raw score sits on a .5 rounding edge
+    (where np.exp and math.exp may differ by an ulp) are re-scored with the
+    scalar function.
+    """
+    if _load_numpy() is None:
+        raise RuntimeError("numpy is required for batch scoring")
+
+    c = np.asarray(chars_typed, dtype=np.int64)
+    ms = np.asarray(time_spent_ms, dtype=np.int64)
+    bs = np.asarray(backspaces, dtype=np.int64)
+    att = np.asarray(attempt_count, dtype=np.int64)
+    h = np.asarray(hint_count, dtype=np.int64)
+    f = np.asarray(final_request_count, dtype=np.int64)
+    sp = np.asarray(structure, dtype=np.float64)
+
+    mask = np.zeros(c.shape, dtype=np.int64)
+
+    length_points = 40 * (1 - np.exp(-c / 250))
+    mask |= (c >= 120) << 0
+
+    time_sec = ms / 1000
+    time_points = 25 * (1 - np.exp(-time_sec / 45))
+    mask |= (time_sec >= 25) << 1
+
+    iteration_points = 15 * (1 - np.exp(-(np.maximum(att, 1) - 1) / 2))
+    mask |= (att >= 2) << 2
+
+    edit_points = np.clip(10 * (1 / (1 + np.exp(-((bs - 8) / 10)))), 0, 10)
+    mask |= (bs >= 8) << 3
+
+    mask |= (sp >= 6) << 4
+
+    base = length_points + time_points + iteration_points + edit_points + sp
+
+    hint_penalty = np.minimum(20, 6 * h)
+    mask |= (h > 0) << 5
+
+    asked_final = f > 0
+    low_effort = (c < 80) | (time_sec < 15)
+    final_early_penalty = np.where(asked_final, 18 + 12 * low_effort + np.minimum(5, 2 * f), 0)
+    mask |= asked_final << 6
+
+    raw = np.clip(base - hint_penalty - final_early_penalty, 0, 100)
+    score = np.round(raw).astype(np.int64)  # round-half-even, like round()
+
+    edge = np.flatnonzero(np.abs(raw - np.floor(raw) - 0.5) < 1e-9)
+    for i in edge:
+        m = EffortMetrics(int(c[i]), int(ms[i]), int(bs[i]), int(att[i]), int(h[i]), int(f[i]))
+        score[i] = compute_effort_score("", m, sp=float(sp[i]))[0]
+
+    cheese = asked_final & (c < 120) & (time_sec < 25) & (att <= 1)
+    score = np.where(cheese, np.minimum(score, 39), score)
+    mask |= cheese << 7
+
+    state = np.where(score <= 29, 0, np.where(score <= 69, 1, 2))
+    unlocked = (score >= 70) & (f <= 1) & (h <= 3)
+
+    reliance = _reliance_table()[np.clip(h, 0, 5), np.clip(f, 0, 3), np.clip(att, 0, 4)]
+
+    return {
+        "score": score,
+        "state": state,
+        "unlocked": unlocked,
+        "reasons_mask": mask,
+        "reliance": reliance,
+    }
+
 # ---------------------------
 # Skill tagging
 # ---------------------------
@@ -160,48 +295,533 @@ TAG_RULES = {
 }
 
 def skill_tags(user_text: str) -> List[str]:
-    text = (user_text or "").lower()
-    scores: Dict[str, int] = {k: 0 for k in TAG_RULES}
+    return scan_text(user_text).tags
+
+def _pick_tags(scores: Dict[str, int]) -> List[str]:
+    picked = [t for t, s in sorted(scores.items(), key=lambda x: x[1], reverse=True) if s > 0]
+    return picked[:2] if picked else ["Recall"]
 
-    for tag, patterns in TAG_RULES.items():
+# ---------------------------
+# Single-pass text scanner
+# ---------------------------
+#
+# TAG_RULES and the structure checks are compiled once into word/phrase tables.
+# scan_text() tokenizes the text with one linear regex pass and looks every token
+# up, so the cost is O(len(text)) whatever the rule count (no `.*` backtracking).
+# Texts longer than MAX_SCAN_CHARS are only scanned up to the cap (the
+# len(text) > 200 heuristic still sees the full length); below the cap the
+# results are identical to running each TAG_RULES regex with re.search.
+
+MAX_SCAN_CHARS = 50_000
+
+_TOKEN_RE = re.compile(r"\w+|\n|[.!?]+|->|=")
+_DIGITS_DOT_RE = re.compile(r"\d+\.")
+_CONNECTORS = frozenset(["because", "so", "therefore", "thus", "however", "if", "then", "since"])
+
+def _expand_optionals(body: str) -> List[str]:
+    """'use (the )?formula' -> ['use the formula', 'use formula']"""
+    m = re.search(r"\(([^()]*)\)\?|([^\\()])\?", body)
+    if not m:
+        return [body]
+    opt = m.group(1) if m.group(1) is not None else m.group(2)
+    return (_expand_optionals(body[:m.start()] + opt + body[m.end():])
+            + _expand_optionals(body[:m.start()] + body[m.end():]))
+
+def _compile_rules(rules: Dict[str, List[str]]):
+    words: Dict[str, List[int]] = {}
+    phrases: Dict[str, List[Tuple[int, List[Tuple[str, str]]]]] = {}
+    line_pairs: List[Tuple[int, str, str]] = []
+    rule_tags: List[str] = []
+
+    for tag, patterns in rules.items():
         for p in patterns:
-            if re.search(p, text):
-                scores[tag] += 1
+            rid = len(rule_tags)
+            rule_tags.append(tag)
+            if not (p.startswith(r"\b") and p.endswith(r"\b")):
+                raise ValueError(f"unsupported TAG_RULES pattern: {p!r}")
+            body = p[2:-2]
+
+            # r"\bif\b.*\bthen\b": both words on the same line, in that order
+            m = re.fullmatch(r"(\w+)\\b\.\*\\b(\w+)", body)
+            if m:
+                line_pairs.append((rid, m.group(1), m.group(2)))
+                continue
+
+            for variant in _expand_optionals(body):
+                parts = re.findall(r"\w+|\W+", variant)
+                if not parts or not re.fullmatch(r"\w+", parts[0]) or not re.fullmatch(r"\w+", parts[-1]) \
+                        or any(c in variant for c in "\\.*+?()[]{}|^$"):
+                    raise ValueError(f"unsupported TAG_RULES pattern: {p!r}")
+                if len(parts) == 1:
+                    words.setdefault(variant, []).append(rid)
+                else:
+                    # [(word, gap_after), ...] for the words before the last one
+                    before = [(parts[i], parts[i + 1]) for i in range(0, len(parts) - 1, 2)]
+                    phrases.setdefault(parts[-1], []).append((rid, before))
+
+    return words, phrases, line_pairs, rule_tags
+
+_WORD_RULES, _PHRASE_RULES, _LINE_RULES, _RULE_TAGS = _compile_rules(TAG_RULES)
+_PHRASE_MAX = max((len(b) for rs in _PHRASE_RULES.values() for _, b in rs), default=0)
+_LINE_STARTS = {first for _, first, _ in _LINE_RULES}
+_LINE_WORDS = _LINE_STARTS | {later for _, _, later in _LINE_RULES}
+# every word that can matter; anything else only needs the digit check
+_INTERESTING = (
+    set(_WORD_RULES) | set(_PHRASE_RULES) | {w for rs in _PHRASE_RULES.values() for _, b in rs for w, _ in b}
+    | {w for _, first, later in _LINE_RULES for w in (first, later)} | _CONNECTORS | {"step"}
+)
+
+@dataclass
+class TextFeatures:
+    tag_scores: Dict[str, int]
+    tags: List[str]        # == skill_tags(text)
+    structure: float       # == structure_points(text)
+
+def _scan_tokens(text: str):
+    """
+    The token pass behind scan_text() on already lower-cased text:
+    (rule hits, sentence-end runs, connector?, step marker?, digit or '='?, line-rule words seen).
+    """
+    hit = bytearray(len(_RULE_TAGS))
+    recent: List[Tuple[str, int, int]] = []   # last few interesting word tokens
+    open_firsts = set()                        # line-rule first words seen on this line
+    line_words = set()
+    has_digit_or_eq = False
+    sentence_ends = 0
+    connector = False
+    step = False
+
+    for tok in _TOKEN_RE.finditer(text):
+        w = tok.group()
+        start, end = tok.span()
+        c = w[0]
+
+        if c == "\n":
+            open_firsts.clear()
+            nxt = text[end:end + 1]
+            if nxt == "-" or (nxt and _DIGITS_DOT_RE.match(text, end)):
+                step = True
+            continue
+        if c in ".!?":
+            sentence_ends += 1
+            continue
+        if c == "=" or c == "-":
+            step = True
+            has_digit_or_eq = has_digit_or_eq or c == "="
+            continue
+
+        # word token
+        if w not in _INTERESTING:
+            if not has_digit_or_eq and not w.isalpha() and any(ch.isdecimal() for ch in w):
+                has_digit_or_eq = True
+            continue
+
+        for rid in _WORD_RULES.get(w, ()):
+            hit[rid] = 1
+        for rid, before in _PHRASE_RULES.get(w, ()):
+            k = len(before)
+            if len(recent) < k:
+                continue
+            nxt_start = start
+            for (bw, gap), (rw, rs, re_) in zip(reversed(before), reversed(recent)):
+                if bw != rw or text[re_:nxt_start] != gap:
+                    break
+                nxt_start = rs
+            else:
+                hit[rid] = 1
+        if w in _LINE_WORDS:
+            line_words.add(w)
+            if open_firsts:
+                for rid, first, later in _LINE_RULES:
+                    if w == later and first in open_firsts:
+                        hit[rid] = 1
+            if w in _LINE_STARTS:
+                open_firsts.add(w)
+
+        if w in _CONNECTORS:
+            connector = True
+        if w == "step":
+            step = True
+
+        # skipped words still break phrases: they end up inside the gap text
+        if _PHRASE_MAX:
+            recent.append((w, start, end))
+            if len(recent) > _PHRASE_MAX:
+                recent.pop(0)
+
+    return hit, sentence_ends, connector, step, has_digit_or_eq, line_words
+
+def _has_non_ascii_letters(text: str) -> bool:
+    # non-ASCII letters can case-fold differently under re.I than via str.lower()
+    return not text.isascii() and any(ch.isalnum() and not ch.isascii() for ch in text)
+
+def _tag_scores(hit, full_len: int, has_digit_or_eq: bool) -> Dict[str, int]:
+    scores: Dict[str, int] = {k: 0 for k in TAG_RULES}
+    for rid, h in enumerate(hit):
+        if h:
+            scores[_RULE_TAGS[rid]] += 1
 
     # heuristics
-    if len(text) > 200 and scores["Analysis"] == 0:
+    if full_len > 200 and scores["Analysis"] == 0:
         scores["Analysis"] += 1
-    if re.search(r"=|\d", text) and scores["Application"] == 0:
+    if has_digit_or_eq and scores["Application"] == 0:
         scores["Application"] += 1
+    return scores
 
-    picked = [t for t, s in sorted(scores.items(), key=lambda x: x[1], reverse=True) if s > 0]
-    return picked[:2] if picked else ["Recall"]
+def _points(sentence_ends: int, connector: bool, step: bool) -> float:
+    pts = 0.0
+    if sentence_ends >= 2:
+        pts += 3
+    if connector:
+        pts += 3
+    if step:
+        pts += 4
+    return clamp(pts, 0, 10)
+
+def scan_text(user_text: str) -> TextFeatures:
+    text = (user_text or "").lower()
+    full_len = len(text)
+    if full_len > MAX_SCAN_CHARS:
+        text = text[:MAX_SCAN_CHARS]
+
+    hit, sentence_ends, connector, step, has_digit_or_eq, _ = _scan_tokens(text)
+
+    scores = _tag_scores(hit, full_len, has_digit_or_eq)
+    tags = _pick_tags(scores)
+
+    # structure points (scored on the original text with re.I)
+    if not user_text:
+        structure = 0.0
+    elif _has_non_ascii_letters(user_text):
+        structure = _structure_points_re(user_text[:MAX_SCAN_CHARS])
+    else:
+        structure = _points(sentence_ends, connector, step)
+
+    return TextFeatures(scores, tags, structure)
+
+# ---------------------------
+# Incremental draft scoring
+# ---------------------------
+#
+# Every rule above is local: words, phrases (gaps are " " or "-"), [.!?] runs,
+# "->", "=" and "\n-"/"\n1." never cross a sentence end or a newline. So the
+# draft is kept as segments cut after each [.!?] run and after each "\n", each
+# with its own scan_text()-style features, and the aggregates are counts over
+# segments. An edit rescans only the segments it touches (plus one neighbour
+# on each side, whose cut may move). The one rule that spans segments,
+# r"\bif\b.*\bthen\b" (same line), is re-derived from per-segment word sets,
+# and only after edits that touch those words or a newline.
+
+_SENTENCE_CHARS = frozenset(".!?")
+
+def _split_segments(text: str) -> List[str]:
+    segs, start = [], 0
+    for i in range(1, len(text)):
+        prev = text[i - 1]
+        if prev == "\n" or (prev in _SENTENCE_CHARS and text[i] not in _SENTENCE_CHARS):
+            segs.append(text[start:i])
+            start = i
+    if start < len(text):
+        segs.append(text[start:])
+    return segs
+
+class _Segment:
+    __slots__ = ("text", "lower_len", "hits", "sentence_ends", "connector", "step", "digit", "line_words")
+
+    def __init__(self, text: str, line_start: bool):
+        self.text = text
+        # "\n" keeps the "\n-" / "\n1." step markers visible to a segment that starts a line
+        scanned = "\n" + text if line_start else text
+        lowered = scanned.lower()
+        self.lower_len = len(lowered) - line_start   # scan_text() measures the lower-cased text
+        hit, self.sentence_ends, self.connector, self.step, self.digit, words = _scan_tokens(lowered)
+        if _has_non_ascii_letters(text):
+            self.sentence_ends = len(_SENTENCE_END_RE.findall(scanned))
+            self.connector = bool(_CONNECTOR_RE.search(scanned))
+            self.step = bool(_STEP_RE.search(scanned))
+        self.hits = [rid for rid, h in enumerate(hit) if h]
+        self.line_words = words
+
+class DraftScorer:
+    """
+    Effort score of a draft that changes by small edits (the live meter on /ws).
+
+        d = DraftScorer()
+        d.insert(0, "I think u = x")
+        d.delete(8, 5)
+        d.score(metrics)   # == compute_effort_score(d.text, metrics)
+        d.features()       # tags/structure == scan_text(d.text)
+
+    An edit costs O(len(edit) + the sentences it touches); edits near the
+    previous one (a typing cursor) find their segment in O(1). Drafts longer
+    than MAX_SCAN_CHARS fall back to a full scan_text().
+    """
+
+    def __init__(self, text: str = ""):
+        self._segs: List[_Segment] = []
+        self._len = 0
+        self._lower_len = 0
+        self._hits = [0] * len(_RULE_TAGS)   # segments hitting each rule
+        self._sentence_ends = 0
+        self._connectors = 0
+        self._steps = 0
+        self._digits = 0
+        self._line_hits: set = set()          # line rules matched across segments
+        self._line_dirty = False
+        self._cursor = (0, 0)                  # (segment index, its offset) of the last edit
+        if text:
+            self.replace(0, 0, text)
+
+    def __len__(self) -> int:
+        return self._len
+
+    @property
+    def text(self) -> str:
+        return "".join(seg.text for seg in self._segs)
+
+    def insert(self, pos: int, text: str) -> None:
+        self.replace(pos, pos, text)
+
+    def delete(self, pos: int, n: int) -> None:
+        self.replace(pos, pos + n, "")
+
+    def clear(self) -> None:
+        self.__init__()
+
+    def _locate(self, pos: int) -> Tuple[int, int]:
+        k, off = self._cursor
+        k = min(k, len(self._segs) - 1)
+        if k != self._cursor[0]:
+            off = self._len - len(self._segs[k].text)
+        while pos < off:
+            k -= 1
+            off -= len(self._segs[k].text)
+        while pos >= off + len(self._segs[k].text):
+            off += len(self._segs[k].text)
+            k += 1
+        return k, off
+
+    def _account(self, seg: _Segment, sign: int) -> None:
+        for rid in seg.hits:
+            self._hits[rid] += sign
+        self._sentence_ends += sign * seg.sentence_ends
+        self._connectors += sign * seg.connector
+        self._steps += sign * seg.step
+        self._digits += sign * seg.digit
+        self._lower_len += sign * seg.lower_len
+        if seg.line_words or seg.text.endswith("\n"):
+            self._line_dirty = True
+
+    def replace(self, start: int, end: int, text: str) -> None:
+        """Replace draft[start:end] with `text`."""
+        if not 0 <= start <= end <= self._len:
+            raise ValueError(f"edit [{start}:{end}] outside draft of length {self._len}")
+        if start == end and not text:
+            return
+
+        if self._segs:
+            # the segments holding draft[start-1] .. draft[end]: cuts outside them can't move
+            first, base = self._locate(max(start - 1, 0))
+            self._cursor = (first, base)
+            last, _ = self._locate(min(end, self._len - 1))
+        else:
+            first, base, last = 0, 0, -1
+        old = self._segs[first:last + 1]
+        joined = "".join(seg.text for seg in old)
+        merged = joined[:start - base] + text + joined[end - base:]
+
+        line_start = first > 0 and self._segs[first - 1].text.endswith("\n")
+        new = []
+        for piece in _split_segments(merged):
+            new.append(_Segment(piece, line_start))
+            line_start = piece.endswith("\n")
+
+        for seg in old:
+            self._account(seg, -1)
+        for seg in new:
+            self._account(seg, +1)
+        self._segs[first:last + 1] = new
+        self._len += len(text) - (end - start)
+        self._cursor = (first, base) if first < len(self._segs) else (0, 0)
+
+    def _cross_segment_hits(self) -> set:
+        if self._line_dirty:
+            self._line_dirty = False
+            hits = set()
+            for rid, first, later in _LINE_RULES:
+                seen_first = False
+                for seg in self._segs:
+                    if seen_first and later in seg.line_words:
+                        hits.add(rid)
+                        break
+                    if first in seg.line_words:
+                        seen_first = True
+                    if seg.text.endswith("\n"):
+                        seen_first = False
+            self._line_hits = hits
+        return self._line_hits
+
+    def features(self) -> TextFeatures:
+        if max(self._len, self._lower_len) > MAX_SCAN_CHARS:
+            return scan_text(self.text)
+        hit = [1 if n else 0 for n in self._hits]
+        for rid in self._cross_segment_hits():
+            hit[rid] = 1
+        scores = _tag_scores(hit, self._lower_len, self._digits > 0)
+        structure = _points(self._sentence_ends, self._connectors > 0, self._steps > 0) if self._len else 0.0
+        return TextFeatures(scores, _pick_tags(scores), structure)
+
+    def score(self, m: EffortMetrics) -> Tuple[int, str, bool, List[str]]:
+        return compute_effort_score("", m, sp=self.features().structure)
 
 # ---------------------------
 # Summary generator
 # ---------------------------
 
-def generate_summary(turns: List[dict]) -> dict:
-    scores = [t["score"] for t in turns if "score" in t]
-    hint_uses = sum(1 for t in turns if t.get("mode") == "HINT")
-    finals = sum(1 for t in turns if t.get("mode") == "FINAL")
-    unlock_turn = next((i + 1 for i, t in enumerate(turns) if t.get("unlocked")), None)
+class SummaryStats:
+    """
+    Running aggregates behind generate_summary(), updated once per turn so a
+    SUMMARY request costs O(1) no matter how long the session is.
+    """
 
-    tag_counts: Dict[str, int] = {}
-    for t in turns:
-        for tag in t.get("tags", []):
-            tag_counts[tag] = tag_counts.get(tag, 0) + 1
+    __slots__ = ("turns", "scored", "score_sum", "score_min", "score_max",
+                 "hints", "finals", "unlock_turn", "tag_counts", "_ranked", "_first_seen")
+
+    def __init__(self):
+        self.turns = 0
+        self.scored = 0
+        self.score_sum = 0
+        self.score_min = 0
+        self.score_max = 0
+        self.hints = 0
+        self.finals = 0
+        self.unlock_turn: Optional[int] = None
+        self.tag_counts: Dict[str, int] = {}
+        # tags ordered by (count desc, first seen) -- same order as a stable sort of tag_counts
+        self._ranked: List[str] = []
+        self._first_seen: Dict[str, int] = {}
+
+    def add(self, turn: dict) -> None:
+        self.turns += 1
+
+        if "score" in turn:
+            sc = turn["score"]
+            if self.scored == 0:
+                self.score_min = self.score_max = sc
+            else:
+                self.score_min = min(self.score_min, sc)
+                self.score_max = max(self.score_max, sc)
+            self.scored += 1
+            self.score_sum += sc
+
+        mode = turn.get("mode")
+        if mode == "HINT":
+            self.hints += 1
+        elif mode == "FINAL":
+            self.finals += 1
+
+        if self.unlock_turn is None and turn.get("unlocked"):
+            self.unlock_turn = self.turns
+
+        for tag in turn.get("tags", []):
+            self._bump_tag(tag)
+
+    def _bump_tag(self, tag: str) -> None:
+        counts = self.tag_counts
+        if tag not in counts:
+            counts[tag] = 0
+            self._first_seen[tag] = len(self._first_seen)
+            self._ranked.append(tag)
+        counts[tag] += 1
+
+        # bubble the tag left past anything it now outranks (at most a few distinct tags)
+        ranked, first = self._ranked, self._first_seen
+        i = ranked.index(tag)
+        c, f = counts[tag], first[tag]
+        while i > 0:
+            prev = ranked[i - 1]
+            if counts[prev] > c or (counts[prev] == c and first[prev] < f):
+                break
+            ranked[i - 1], ranked[i] = tag, prev
+            i -= 1
+
+    def effort_avg(self) -> float:
+        if not self.scored:
+            return 0
+        # statistics.mean() of ints gives an int when exact, so mirror that
+        q, r = divmod(self.score_sum, self.scored)
+        return round(q if r == 0 else self.score_sum / self.scored, 1)
+
+    def top_tags(self, k: int = 3) -> List[str]:
+        return self._ranked[:k]
+
+    def merge(self, later: "SummaryStats") -> None:
+        """Appends the turns aggregated in `later` (which came after ours, e.g. the next log chunk)."""
+        if later.scored:
+            if self.scored == 0:
+                self.score_min, self.score_max = later.score_min, later.score_max
+            else:
+                self.score_min = min(self.score_min, later.score_min)
+                self.score_max = max(self.score_max, later.score_max)
+        if self.unlock_turn is None and later.unlock_turn is not None:
+            self.unlock_turn = self.turns + later.unlock_turn
+
+        self.turns += later.turns
+        self.scored += later.scored
+        self.score_sum += later.score_sum
+        self.hints += later.hints
+        self.finals += later.finals
+
+        for tag in sorted(later.tag_counts, key=later._first_seen.__getitem__):
+            if tag not in self.tag_counts:
+                self.tag_counts[tag] = 0
+                self._first_seen[tag] = len(self._first_seen)
+            self.tag_counts[tag] += later.tag_counts[tag]
+        counts, first = self.tag_counts, self._first_seen
+        self._ranked = sorted(counts, key=lambda t: (-counts[t], first[t]))
+
+    def to_state(self) -> list:
+        """JSON-friendly snapshot (for checkpoints); from_state() reverses it."""
+        tags = sorted(self.tag_counts, key=self._first_seen.__getitem__)
+        return [self.turns, self.scored, self.score_sum, self.score_min, self.score_max,
+                self.hints, self.finals, self.unlock_turn, [[t, self.tag_counts[t]] for t in tags]]
+
+    @classmethod
+    def from_state(cls, state: list) -> "SummaryStats":
+        agg = cls()
+        (agg.turns, agg.scored, agg.score_sum, agg.score_min, agg.score_max,
+         agg.hints, agg.finals, agg.unlock_turn, tags) = state
+        for i, (tag, n) in enumerate(tags):
+            agg.tag_counts[tag] = n
+            agg._first_seen[tag] = i
+        counts = agg.tag_counts
+        agg._ranked = sorted(counts, key=lambda t: (-counts[t], agg._first_seen[t]))
+        return agg
+
+def generate_summary(turns) -> dict:
+    """
+    `turns` is either the list of turn dicts or a session's SummaryStats
+    (the running aggregates, which skip the rescan).
+    """
+    if isinstance(turns, SummaryStats):
+        agg = turns
+    else:
+        agg = SummaryStats()
+        for t in turns:
+            agg.add(t)
 
-    top_tags = [k for k, _ in sorted(tag_counts.items(), key=lambda x: x[1], reverse=True)][:3]
+    hint_uses = agg.hints
+    unlock_turn = agg.unlock_turn
+    top_tags = agg.top_tags(3)
 
     out = {
-        "turns_total": len(turns),
+        "turns_total": agg.turns,
         "turns_to_unlock": unlock_turn,
         "hints_used": hint_uses,
-        "final_requests": finals,
-        "effort_avg": round(mean(scores), 1) if scores else 0,
-        "effort_min": min(scores) if scores else 0,
-        "effort_max": max(scores) if scores else 0,
+        "final_requests": agg.finals,
+        "effort_avg": agg.effort_avg(),
+        "effort_min": agg.score_min,
+        "effort_max": agg.score_max,
         "top_skill_tags": top_tags or ["Recall"],
     }
 
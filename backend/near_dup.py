@@ -0,0 +1,243 @@
+# backend/near_dup.py
+"""
+Near-duplicate question index: reuse a tutor reply from an earlier, equivalent
+question (any session) instead of calling the LLM again.
+
+Questions are normalized, cut into character shingles and MinHashed; LSH
+banding finds candidates in O(bands) and the signature agreement estimates
+Jaccard similarity. Entries are keyed by (task_type, mode), and a match also
+needs the same numbers and operators in the same order ("x e^2x" is not
+"x e^3x", "x^2+3x=0" is not "x^2-3x=0").
+
+Only replies to a question asked without conversation context are stored or
+served (main.reuse_reply / remember_reply).
+
+    NEAR_DUP=1                    enable (off by default: a wrong match serves another question's reply)
+    NEAR_DUP_MODES=HINT,SOCRATIC  modes whose replies are reused
+    NEAR_DUP_THRESHOLD=0.8        min estimated Jaccard similarity
+    NEAR_DUP_MAX_ENTRIES=20000    LRU bound
+    NEAR_DUP_TTL_S=604800         entries older than this are dropped
+    NEAR_DUP_PATH=                optional JSON file loaded at startup, written at shutdown
+"""
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from response_cache import normalize_user_text
+
+ENABLED = os.getenv("NEAR_DUP", "0") == "1"
+REUSE_MODES = set(filter(None, os.getenv("NEAR_DUP_MODES", "HINT,SOCRATIC").split(",")))
+THRESHOLD = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+MAX_ENTRIES = int(os.getenv("NEAR_DUP_MAX_ENTRIES", "20000"))
+TTL_S = float(os.getenv("NEAR_DUP_TTL_S", str(7 * 24 * 3600)))
+PATH = os.getenv("NEAR_DUP_PATH", "")
+
+SHINGLE = 4
+BANDS, ROWS = 16, 4          # 64 hashes; candidates from ~0.5 similarity, verified against THRESHOLD
+NUM_PERM = BANDS * ROWS
+_PRIME = (1 << 31) - 1       # keeps a*x+b inside uint64
+
+# fixed seeds so signatures survive restarts (persistence) and match across workers
+_A = [(0x9E3779B1 * (i + 1)) % _PRIME or 1 for i in range(NUM_PERM)]
+_B = [(0x85EBCA6B * (i + 7)) % _PRIME for i in range(NUM_PERM)]
+
+FORMAT = 2                   # persisted file layout / meaning of Entry.math
+
+_OPERATORS = "-+*/^=<>−×÷≤≥"
+_TOKEN_RE = re.compile(rf"\w+|[{re.escape(_OPERATORS)}]")
+_MATH_RE = re.compile(rf"\d+(?:\.\d+)?|[{re.escape(_OPERATORS)}]")
+
+Signature = Tuple[int, ...]
+
+def canonical(text: str) -> str:
+    """'How do I integrate x*e^x??' -> 'how do i integrate x * e ^ x' (operators and signs are kept)"""
+    return " ".join(_TOKEN_RE.findall(normalize_user_text(text)))
+
+def math_tokens(text: str) -> Tuple[str, ...]:
+    """'x^2+3x=0' -> ('^', '2', '+', '3', '=', '0'): must match exactly for a reply to be reused."""
+    return tuple(_MATH_RE.findall(text))
+
+def shingles(canon: str) -> List[int]:
+    if len(canon) <= SHINGLE:
+        grams = {canon}
+    else:
+        grams = {canon[i:i + SHINGLE] for i in range(len(canon) - SHINGLE + 1)}
+    return [zlib.crc32(g.encode("utf-8")) % _PRIME for g in grams]
+
+_np_perm = None  # (numpy, A column, B column), built on first use so import stays cheap
+
+def _numpy_perm():
+    global _np_perm
+    if _np_perm is None:
+        try:
+            import numpy as np
+        except Exception:  # pure-Python MinHash gives the same signatures, just slower
+            _np_perm = ()
+        else:
+            _np_perm = (np, np.array(_A, dtype=np.uint64)[:, None], np.array(_B, dtype=np.uint64)[:, None])
+    return _np_perm
+
+def minhash(hashes: List[int]) -> Signature:
+    perm = _numpy_perm()
+    if perm:
+        np, a, b = perm
+        x = np.array(hashes, dtype=np.uint64)[None, :]
+        return tuple(((a * x + b) % _PRIME).min(axis=1).tolist())
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in zip(_A, _B))
+
+def similarity(a: Signature, b: Signature) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+class Entry:
+    __slots__ = ("key", "sig", "math", "reply", "created", "hits")
+
+    def __init__(self, key: Tuple[str, str], sig: Signature, math: Tuple[str, ...], reply: str,
+                 created: float, hits: int = 0):
+        self.key, self.sig, self.math, self.reply = key, sig, math, reply
+        self.created, self.hits = created, hits
+
+class NearDupIndex:
+    """Thread-safe MinHash/LSH index with LRU + TTL eviction."""
+
+    def __init__(self, threshold: float = THRESHOLD, max_entries: int = MAX_ENTRIES, ttl_s: float = TTL_S):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[int, Entry]" = OrderedDict()
+        self._buckets: Dict[tuple, List[int]] = {}   # (task_type, mode, band, band hashes) -> entry ids
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _bands(key: Tuple[str, str], sig: Signature):
+        for b in range(BANDS):
+            yield (*key, b, sig[b * ROWS:(b + 1) * ROWS])
+
+    def _signature(self, text: str) -> Optional[Signature]:
+        canon = canonical(text)
+        return minhash(shingles(canon)) if canon else None
+
+    def lookup(self, task_type: str, mode: str, text: str) -> Optional[str]:
+        sig = self._signature(text)
+        if sig is None:
+            return None
+        key, math, now = (task_type, mode), math_tokens(text), time.time()
+
+        with self._lock:
+            best, best_sim = None, self.threshold
+            seen = set()
+            for band in self._bands(key, sig):
+                for eid in self._buckets.get(band, ()):
+                    if eid in seen:
+                        continue
+                    seen.add(eid)
+                    e = self._entries[eid]
+                    if e.math != math or now - e.created > self.ttl_s:
+                        continue
+                    sim = similarity(sig, e.sig)
+                    if sim >= best_sim:
+                        best, best_sim = eid, sim
+
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            e = self._entries[best]
+            e.hits += 1
+            self._entries.move_to_end(best)
+            return e.reply
+
+    def add(self, task_type: str, mode: str, text: str, reply: str) -> None:
+        sig = self._signature(text)
+        if sig is None or self.max_entries <= 0:
+            return
+        self._insert(Entry((task_type, mode), sig, math_tokens(text), reply, time.time()))
+
+    def _insert(self, e: Entry) -> None:
+        with self._lock:
+            eid = self._next_id
+            self._next_id += 1
+            self._entries[eid] = e
+            for band in self._bands(e.key, e.sig):
+                self._buckets.setdefault(band, []).append(eid)
+
+            now = time.time()
+            while self._entries:
+                oldest_id, oldest = next(iter(self._entries.items()))
+                if len(self._entries) <= self.max_entries and now - oldest.created <= self.ttl_s:
+                    break
+                self._drop(oldest_id)
+                self.evictions += 1
+
+    def _drop(self, eid: int) -> None:
+        # caller holds the lock
+        e = self._entries.pop(eid)
+        for band in self._bands(e.key, e.sig):
+            ids = self._buckets[band]
+            ids.remove(eid)
+            if not ids:
+                del self._buckets[band]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "buckets": len(self._buckets),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "threshold": self.threshold,
+                "modes": sorted(REUSE_MODES),
+            }
+
+    # ---------------------------
+    # Persistence
+    # ---------------------------
+
+    def save(self, path: str) -> None:
+        with self._lock:
+            rows = [[*e.key, list(e.sig), list(e.math), e.reply, e.created, e.hits]
+                    for e in self._entries.values()]
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"format": FORMAT, "num_perm": NUM_PERM, "entries": rows}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> int:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("num_perm") != NUM_PERM or data.get("format", 1) != FORMAT:
+            print("NEAR DUP INDEX SKIPPED (signature format changed):", path)
+            return 0
+        for task_type, mode, sig, math, reply, created, hits in data["entries"]:
+            self._insert(Entry((task_type, mode), tuple(sig), tuple(math), reply, created, hits))
+        return len(self._entries)
+
+index = NearDupIndex()
+
+def load_persisted() -> None:
+    if PATH and os.path.exists(PATH):
+        try:
+            print("NEAR DUP INDEX LOADED:", index.load(PATH), "entries")
+        except Exception as e:
+            print("NEAR DUP INDEX LOAD FAILED:", repr(e))
+
+def save_persisted() -> None:
+    if PATH:
+        try:
+            index.save(PATH)
+        except Exception as e:
+            print("NEAR DUP INDEX SAVE FAILED:", repr(e))
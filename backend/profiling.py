@@ -0,0 +1,170 @@
+# backend/profiling.py
+"""
+Opt-in request profiling and memory snapshots, for chasing a slow /chat or a
+growing process without redeploying.
+
+A sampled fraction of HTTP requests, or any request sent with
+`X-Profile: <ADMIN_TOKEN>`, runs under cProfile (stdlib, so nothing to
+install) from the first byte in to the last byte out. That covers chat() and
+everything it calls (metrics scanning, task detection, the LLM client). The
+stats are written to PROFILE_DIR as `<utc time>-<path>.prof`; load one
+with `python -m pstats` or snakeviz. Only the newest PROFILE_KEEP files are
+kept. The response carries `X-Profile-Id: <file name>` (sampled ones faster
+than PROFILE_MIN_MS are dropped after all).
+
+cProfile sees the whole thread, so one request is profiled at a time and
+other coroutines that run on the loop meanwhile show up in its profile too.
+Others are skipped while one is in progress.
+
+    PROFILE_SAMPLE=0          fraction of requests to profile (0.01 = 1%)
+    PROFILE_MIN_MS=0          sampled profiles faster than this aren't written
+    PROFILE_DIR=profiles
+    PROFILE_KEEP=50
+    ADMIN_TOKEN=              enables X-Profile and the /debug/* endpoints (unset = disabled)
+    TRACEMALLOC=0             trace allocations from startup (1 = on, N = frames kept per trace)
+"""
+import asyncio
+import cProfile
+import hmac
+import os
+import random
+import re
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+SAMPLE = float(os.getenv("PROFILE_SAMPLE", "0"))
+MIN_MS = float(os.getenv("PROFILE_MIN_MS", "0"))
+DIR = os.getenv("PROFILE_DIR", "profiles")
+KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC", "0"))
+
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and \
+        hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+stats: Dict[str, int] = {"profiled": 0, "written": 0, "skipped_busy": 0, "write_failed": 0}
+
+def _write(profiler: cProfile.Profile, name: str) -> None:
+    os.makedirs(DIR, exist_ok=True)
+    profiler.dump_stats(os.path.join(DIR, name))
+    files = sorted(f for f in os.listdir(DIR) if f.endswith(".prof"))
+    for old in files[:max(0, len(files) - KEEP)]:
+        try:
+            os.remove(os.path.join(DIR, old))
+        except OSError:
+            pass
+
+class ProfilingMiddleware:
+    """Plain ASGI middleware, like telemetry.TimingMiddleware."""
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        forced = False
+        if ADMIN_TOKEN:
+            for k, v in scope.get("headers", ()):
+                if k == b"x-profile":
+                    forced = is_admin(v.decode("latin-1"))
+                    break
+        if not forced and not (SAMPLE > 0 and random.random() < SAMPLE):
+            return await self.app(scope, receive, send)
+        if self._busy:
+            stats["skipped_busy"] += 1
+            return await self.app(scope, receive, send)
+
+        started = time.time()
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(started))}-{int(started * 1000) % 1000:03d}" \
+               f"-{_UNSAFE_RE.sub('_', scope.get('path', '')).strip('_') or 'root'}"
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", f"{name}.prof".encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        self._busy = True
+        profiler = cProfile.Profile()
+        t0 = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.disable()
+            self._busy = False
+            ms = (time.perf_counter() - t0) * 1000
+            stats["profiled"] += 1
+            if forced or ms >= MIN_MS:
+                try:
+                    await asyncio.to_thread(_write, profiler, f"{name}.prof")
+                    stats["written"] += 1
+                except Exception as e:
+                    stats["write_failed"] += 1
+                    print("PROFILE WRITE FAILED:", repr(e))
+
+def profile_stats() -> dict:
+    files = sorted(f for f in os.listdir(DIR) if f.endswith(".prof")) if os.path.isdir(DIR) else []
+    return {"sample": SAMPLE, "min_ms": MIN_MS, "dir": DIR, "keep": KEEP,
+            "admin_header": bool(ADMIN_TOKEN), **stats, "files": files[-10:]}
+
+# ---------------------------
+# Memory
+# ---------------------------
+
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+def start_tracemalloc() -> None:
+    if TRACEMALLOC_FRAMES and not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+
+def _top(stats: List, limit: int) -> List[dict]:
+    out = []
+    for st in stats[:limit]:
+        frame = st.traceback[0]
+        row = {"where": f"{frame.filename}:{frame.lineno}", "kb": round(st.size / 1024, 1), "count": st.count}
+        if hasattr(st, "size_diff"):
+            row["kb_diff"] = round(st.size_diff / 1024, 1)
+            row["count_diff"] = st.count_diff
+        out.append(row)
+    return out
+
+def memory_report(top: int = 20, start: bool = False) -> dict:
+    """
+    tracemalloc top allocators by line, and the growth since the previous
+    report. Tracing must be on (TRACEMALLOC=1, or start=True here); it only
+    sees allocations made after it started, and slows allocation while on.
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        if not start:
+            return {"tracing": False, "hint": "start with TRACEMALLOC=1 or ?start=1"}
+        tracemalloc.start(max(TRACEMALLOC_FRAMES, 1))
+        _last_snapshot = None
+        return {"tracing": True, "started": True, "hint": "call again later to see allocations"}
+
+    snap = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),  # module code
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    report = {
+        "tracing": True,
+        "traced_kb": round(current / 1024, 1),
+        "peak_kb": round(peak / 1024, 1),
+        "overhead_kb": round(tracemalloc.get_tracemalloc_memory() / 1024, 1),
+        "top": _top(snap.statistics("lineno"), top),
+    }
+    if _last_snapshot is not None:
+        report["growth"] = _top(snap.compare_to(_last_snapshot, "lineno"), top)
+    _last_snapshot = snap
+    return report
@@ -0,0 +1,349 @@
+# backend/replay.py
+"""
+Offline replay + analytics over JSONL turn logs (one /chat request per line:
+{"session_id", "mode", "user_text", "metrics": {...}}, the same shape
+/chat/batch takes).
+
+    python replay.py logs/turns.jsonl --out cohort.json
+    python replay.py logs/*.jsonl --workers 8 --sessions-out summaries.jsonl
+    python replay.py big.jsonl --checkpoint replay.ckpt --resume
+
+Every turn is re-scored with the current compute_effort_score / skill tags /
+detect_task_type, sessions are rebuilt into generate_summary() output, and
+cohort aggregates (per task type) are written: score distribution, states,
+modes, turns to unlock, hint reliance (reliance_index).
+
+Files are cut into byte-range chunks that a process pool streams through
+line by line; each chunk comes back as a small mergeable partial, merged in
+file order. Memory is bounded by the number of distinct sessions, not the
+size of the logs. The checkpoint records the last fully merged offset.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import (
+    EffortMetrics,
+    SummaryStats,
+    compute_effort_score,
+    generate_summary,
+    reliance_index,
+    scan_text,
+)
+from task_detect import detect_task_type
+
+METRIC_FIELDS = ["chars_typed", "time_spent_ms", "backspaces", "attempt_count", "hint_count", "final_request_count"]
+MODES = {"SOCRATIC", "HINT", "FINAL", "REFLECTION", "SUMMARY"}
+RELIANCE_BINS = 10  # 0.0-0.1, ..., 0.9-1.0
+
+Chunk = Tuple[int, str, int, int]  # (file index, path, start, end)
+
+# ---------------------------
+# Aggregates (mergeable)
+# ---------------------------
+
+class CohortAgg:
+    """Per-turn aggregates for one task type."""
+
+    __slots__ = ("turns", "score_hist", "states", "modes", "reliance_sum", "reliance_hist", "tags")
+
+    def __init__(self):
+        self.turns = 0
+        self.score_hist = [0] * 101
+        self.states: Dict[str, int] = {}
+        self.modes: Dict[str, int] = {}
+        self.reliance_sum = 0.0
+        self.reliance_hist = [0] * RELIANCE_BINS
+        self.tags: Dict[str, int] = {}
+
+    def add(self, score: int, state: str, mode: str, reliance: float, tags: List[str]) -> None:
+        self.turns += 1
+        self.score_hist[score] += 1
+        self.states[state] = self.states.get(state, 0) + 1
+        self.modes[mode] = self.modes.get(mode, 0) + 1
+        self.reliance_sum += reliance
+        self.reliance_hist[min(int(reliance * RELIANCE_BINS), RELIANCE_BINS - 1)] += 1
+        for t in tags:
+            self.tags[t] = self.tags.get(t, 0) + 1
+
+    def merge(self, other: "CohortAgg") -> None:
+        self.turns += other.turns
+        self.score_hist = [a + b for a, b in zip(self.score_hist, other.score_hist)]
+        for mine, theirs in ((self.states, other.states), (self.modes, other.modes), (self.tags, other.tags)):
+            for k, v in theirs.items():
+                mine[k] = mine.get(k, 0) + v
+        self.reliance_sum += other.reliance_sum
+        self.reliance_hist = [a + b for a, b in zip(self.reliance_hist, other.reliance_hist)]
+
+    def to_state(self) -> dict:
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    @classmethod
+    def from_state(cls, state: dict) -> "CohortAgg":
+        agg = cls()
+        for k in cls.__slots__:
+            setattr(agg, k, state[k])
+        return agg
+
+class Partial:
+    """What one chunk (or the merged prefix of the logs) adds up to."""
+
+    def __init__(self):
+        self.lines = 0
+        self.bad_lines = 0
+        self.cohorts: Dict[str, CohortAgg] = {}
+        # session_id -> [SummaryStats, latest task type, unlocked so far in this partial]
+        self.sessions: Dict[str, list] = {}
+
+    def add_turn(self, t: dict) -> None:
+        text = t["user_text"]
+        m = EffortMetrics(**t["metrics"])
+        task_type = detect_task_type(text)
+        features = scan_text(text)
+        score, state, unlocked_now, _ = compute_effort_score(text, m, sp=features.structure)
+
+        cohort = self.cohorts.get(task_type)
+        if cohort is None:
+            cohort = self.cohorts[task_type] = CohortAgg()
+        cohort.add(score, state, t["mode"], reliance_index(m), features.tags)
+
+        sess = self.sessions.get(t["session_id"])
+        if sess is None:
+            sess = self.sessions[t["session_id"]] = [SummaryStats(), task_type, False]
+        sess[1] = task_type
+        sess[2] = sess[2] or unlocked_now
+        sess[0].add({"mode": t["mode"], "score": score, "unlocked": sess[2], "tags": features.tags})
+
+    def merge(self, later: "Partial") -> None:
+        self.lines += later.lines
+        self.bad_lines += later.bad_lines
+        for task_type, cohort in later.cohorts.items():
+            if task_type in self.cohorts:
+                self.cohorts[task_type].merge(cohort)
+            else:
+                self.cohorts[task_type] = cohort
+        for sid, (stats, task_type, unlocked) in later.sessions.items():
+            mine = self.sessions.get(sid)
+            if mine is None:
+                self.sessions[sid] = [stats, task_type, unlocked]
+            else:
+                mine[0].merge(stats)
+                mine[1] = task_type
+                mine[2] = mine[2] or unlocked
+
+    def to_state(self) -> dict:
+        return {
+            "lines": self.lines,
+            "bad_lines": self.bad_lines,
+            "cohorts": {k: c.to_state() for k, c in self.cohorts.items()},
+            "sessions": {sid: [st.to_state(), tt, u] for sid, (st, tt, u) in self.sessions.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "Partial":
+        p = cls()
+        p.lines, p.bad_lines = state["lines"], state["bad_lines"]
+        p.cohorts = {k: CohortAgg.from_state(c) for k, c in state["cohorts"].items()}
+        p.sessions = {sid: [SummaryStats.from_state(st), tt, u] for sid, (st, tt, u) in state["sessions"].items()}
+        return p
+
+# ---------------------------
+# Pipeline (runs in the workers)
+# ---------------------------
+
+def read_lines(path: str, start: int, end: int) -> Iterator[bytes]:
+    """Lines that *start* inside [start, end); the line straddling `end` belongs to this chunk."""
+    with open(path, "rb") as f:
+        pos = start
+        if start > 0:
+            f.seek(start - 1)
+            pos = start - 1 + len(f.readline())  # finish the previous chunk's last line
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line
+
+def parse_turns(lines: Iterable[bytes], partial: Partial) -> Iterator[dict]:
+    for raw in lines:
+        partial.lines += 1
+        if not raw.strip():
+            continue
+        try:
+            rec = json.loads(raw)
+            turn = {
+                "session_id": str(rec["session_id"]),
+                "mode": rec.get("mode", "SOCRATIC"),
+                "user_text": rec["user_text"],
+                "metrics": {k: int((rec.get("metrics") or {}).get(k, 0)) for k in METRIC_FIELDS},
+            }
+            if turn["mode"] not in MODES or not isinstance(turn["user_text"], str):
+                raise ValueError(turn["mode"])
+        except (ValueError, KeyError, TypeError):
+            partial.bad_lines += 1
+            continue
+        yield turn
+
+def process_chunk(chunk: Chunk) -> Tuple[Chunk, Partial]:
+    _, path, start, end = chunk
+    partial = Partial()
+    for turn in parse_turns(read_lines(path, start, end), partial):
+        partial.add_turn(turn)
+    return chunk, partial
+
+# ---------------------------
+# Driver
+# ---------------------------
+
+def plan_chunks(paths: List[str], chunk_bytes: int, resume_at: Tuple[int, int] = (0, 0)) -> Iterator[Chunk]:
+    file_i, offset = resume_at
+    for i, path in enumerate(paths):
+        if i < file_i:
+            continue
+        size = os.path.getsize(path)
+        start = offset if i == file_i else 0
+        while start < size:
+            end = min(start + chunk_bytes, size)
+            yield (i, path, start, end)
+            start = end
+
+def percentile(hist: List[int], q: float) -> Optional[int]:
+    total = sum(hist)
+    if not total:
+        return None
+    rank, seen = q * (total - 1), 0
+    for value, n in enumerate(hist):
+        seen += n
+        if seen > rank:
+            return value
+    return len(hist) - 1
+
+def cohort_report(c: CohortAgg, sessions: List[SummaryStats]) -> dict:
+    unlock: Dict[str, int] = {}
+    for st in sessions:
+        k = str(st.unlock_turn) if st.unlock_turn is not None else "never"
+        unlock[k] = unlock.get(k, 0) + 1
+    unlocked = [st.unlock_turn for st in sessions if st.unlock_turn is not None]
+    top = sorted(c.tags.items(), key=lambda kv: -kv[1])[:5]
+    return {
+        "turns": c.turns,
+        "sessions": len(sessions),
+        "score": {
+            "mean": round(sum(v * n for v, n in enumerate(c.score_hist)) / c.turns, 1) if c.turns else None,
+            "p10": percentile(c.score_hist, 0.10),
+            "p50": percentile(c.score_hist, 0.50),
+            "p90": percentile(c.score_hist, 0.90),
+            "hist_by_10": [sum(c.score_hist[i:i + 10]) for i in range(0, 90, 10)] + [sum(c.score_hist[90:])],
+        },
+        "states": c.states,
+        "modes": c.modes,
+        "turns_to_unlock": {
+            "median": sorted(unlocked)[len(unlocked) // 2] if unlocked else None,
+            "never_unlocked": unlock.get("never", 0),
+            "hist": dict(sorted(unlock.items(), key=lambda kv: (kv[0] == "never", int(kv[0]) if kv[0] != "never" else 0))),
+        },
+        "hint_reliance": {
+            "mean": round(c.reliance_sum / c.turns, 3) if c.turns else None,
+            "hist_by_0_1": c.reliance_hist,
+        },
+        "top_tags": [t for t, _ in top],
+    }
+
+def report(total: Partial, elapsed_s: float) -> dict:
+    overall = CohortAgg()
+    for c in total.cohorts.values():
+        overall.merge(c)
+    by_task: Dict[str, List[SummaryStats]] = {}
+    for stats, task_type, _ in total.sessions.values():
+        by_task.setdefault(task_type, []).append(stats)
+
+    return {
+        "lines": total.lines,
+        "bad_lines": total.bad_lines,
+        "elapsed_s": round(elapsed_s, 2),
+        "overall": cohort_report(overall, [s for group in by_task.values() for s in group]),
+        # turns are grouped by their own task type, sessions by their latest one
+        "by_task_type": {tt: cohort_report(c, by_task.get(tt, [])) for tt, c in sorted(total.cohorts.items())},
+    }
+
+def write_json_atomic(path: str, data) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def load_checkpoint(path: str, paths: List[str]) -> Tuple[Tuple[int, int], Partial]:
+    with open(path, encoding="utf-8") as f:
+        ckpt = json.load(f)
+    if ckpt["paths"] != paths:
+        raise SystemExit(f"checkpoint {path} was written for {ckpt['paths']}, not {paths}")
+    return (ckpt["file_index"], ckpt["offset"]), Partial.from_state(ckpt["state"])
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("paths", nargs="+", help="JSONL turn logs, processed in the order given")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (1 = run inline)")
+    ap.add_argument("--chunk-mb", type=float, default=8, help="bytes of log per work unit")
+    ap.add_argument("--out", help="write cohort aggregates JSON here (default: stdout)")
+    ap.add_argument("--sessions-out", help="write one generate_summary() line per session here")
+    ap.add_argument("--checkpoint", help="checkpoint file (written every --checkpoint-every-s)")
+    ap.add_argument("--checkpoint-every-s", type=float, default=30)
+    ap.add_argument("--resume", action="store_true", help="continue from --checkpoint")
+    args = ap.parse_args()
+
+    paths = [os.path.abspath(p) for p in args.paths]
+    resume_at, total = (0, 0), Partial()
+    if args.resume:
+        if not args.checkpoint or not os.path.exists(args.checkpoint):
+            ap.error("--resume needs an existing --checkpoint file")
+        resume_at, total = load_checkpoint(args.checkpoint, paths)
+        print(f"resuming at file {resume_at[0]} offset {resume_at[1]}", file=sys.stderr)
+
+    chunks = plan_chunks(paths, max(1, int(args.chunk_mb * 1024 * 1024)), resume_at)
+    t0 = last_ckpt = time.monotonic()
+
+    def save_checkpoint(chunk: Chunk) -> None:
+        file_i, _, _, end = chunk
+        write_json_atomic(args.checkpoint, {
+            "paths": paths, "file_index": file_i, "offset": end, "state": total.to_state(),
+        })
+
+    pool = Pool(args.workers) if args.workers > 1 else None
+    try:
+        # imap hands results back in file order, so the merged prefix is always contiguous
+        results = pool.imap(process_chunk, chunks) if pool else map(process_chunk, chunks)
+        for chunk, partial in results:
+            total.merge(partial)
+            if args.checkpoint and time.monotonic() - last_ckpt >= args.checkpoint_every_s:
+                save_checkpoint(chunk)
+                last_ckpt = time.monotonic()
+            print(f"{chunk[1]}: {chunk[3]} bytes done, {total.lines} lines", file=sys.stderr)
+    finally:
+        if pool:
+            pool.terminate()
+
+    if args.checkpoint:
+        write_json_atomic(args.checkpoint, {
+            "paths": paths, "file_index": len(paths), "offset": 0, "state": total.to_state(),
+        })
+
+    if args.sessions_out:
+        with open(args.sessions_out, "w", encoding="utf-8") as f:
+            for sid, (stats, task_type, _) in total.sessions.items():
+                f.write(json.dumps({"session_id": sid, "task_type": task_type, **generate_summary(stats)}) + "\n")
+
+    out = json.dumps(report(total, time.monotonic() - t0), indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(out + "\n")
+    else:
+        print(out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
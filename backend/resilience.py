@@ -0,0 +1,275 @@
+# backend/resilience.py
+"""
+Keeps a slow or failing LLM from dragging /chat down with it:
+
+- per-mode deadlines (HINT/SOCRATIC tight, FINAL looser); a stream gets its
+  mode's deadline for the first chunk, then LLM_STREAM_CHUNK_MS between chunks
+- a circuit breaker per backend route: after N consecutive failures every call
+  short-circuits to the caller's fallback, while a background probe checks
+  for recovery
+- optional hedging: if the first request hasn't answered by the backend's
+  recent p95, fire a second one and take whichever finishes first
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+DEADLINES_S = {
+    "SOCRATIC": float(os.getenv("LLM_DEADLINE_SOCRATIC_MS", "4000")) / 1000,
+    "HINT": float(os.getenv("LLM_DEADLINE_HINT_MS", "4000")) / 1000,
+    "REFLECTION": float(os.getenv("LLM_DEADLINE_REFLECTION_MS", "6000")) / 1000,
+    "FINAL": float(os.getenv("LLM_DEADLINE_FINAL_MS", "15000")) / 1000,
+    "DEFAULT": float(os.getenv("LLM_DEADLINE_DEFAULT_MS", "8000")) / 1000,
+}
+
+STREAM_CHUNK_S = float(os.getenv("LLM_STREAM_CHUNK_MS", "10000")) / 1000  # max gap after the first chunk
+
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "10"))
+BREAKER_MAX_COOLDOWN_S = float(os.getenv("LLM_BREAKER_MAX_COOLDOWN_S", "60"))
+
+HEDGE_ENABLED = os.getenv("LLM_HEDGE", "0") == "1"
+HEDGE_MIN_DELAY_S = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250")) / 1000
+HEDGE_DEFAULT_DELAY_S = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_MS", "2000")) / 1000
+
+PROBE_PROMPT = ("Say 'pong' only.", "ping")
+
+def deadline_for(mode: Optional[str]) -> float:
+    return DEADLINES_S.get(mode or "DEFAULT", DEADLINES_S["DEFAULT"])
+
+class LatencyTracker:
+    """Rolling window of successful call latencies; p95 feeds the hedge delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+        self._p95: Optional[float] = None
+        self._since = 0
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._since += 1
+        if self._since >= 20 or self._p95 is None:
+            self._since = 0
+            ordered = sorted(self._samples)
+            self._p95 = ordered[int(0.95 * (len(ordered) - 1))]
+
+    def p95(self) -> Optional[float]:
+        return self._p95 if len(self._samples) >= 20 else None
+
+class CircuitBreaker:
+    CLOSED, OPEN = "closed", "open"
+
+    def __init__(self, route: str, probe: Callable[[], Awaitable[Optional[str]]],
+                 probe_sync: Callable[[], Optional[str]]):
+        self.route = route
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened = 0
+        self.short_circuited = 0
+        self.failures = 0
+        self.timeouts = 0
+        self._probe = probe
+        self._probe_sync = probe_sync
+        self._probing = False
+        self._probe_task: Optional[asyncio.Task] = None  # the loop only keeps weak references to tasks
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+
+    def record_failure(self, timeout: bool = False) -> None:
+        with self._lock:
+            self.failures += 1
+            self.timeouts += int(timeout)
+            self.consecutive_failures += 1
+            if self.state == self.CLOSED and self.consecutive_failures >= BREAKER_FAILURES:
+                self.state = self.OPEN
+                self.opened += 1
+                print("LLM CIRCUIT OPEN:", self.route)
+                self._start_probe()
+
+    def _close(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probing = False
+            self._probe_task = None
+        print("LLM CIRCUIT CLOSED:", self.route)
+
+    def _start_probe(self) -> None:
+        # caller holds the lock
+        if self._probing:
+            return
+        self._probing = True
+        try:
+            self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+        except RuntimeError:  # opened from a sync handler thread
+            threading.Thread(target=self._probe_loop_sync, name=f"probe-{self.route}", daemon=True).start()
+
+    async def _probe_loop(self) -> None:
+        cooldown = BREAKER_COOLDOWN_S
+        while True:
+            await asyncio.sleep(cooldown)
+            try:
+                ok = await asyncio.wait_for(self._probe(), deadline_for("DEFAULT")) is not None
+            except Exception:
+                ok = False
+            if ok:
+                self._close()
+                return
+            cooldown = min(cooldown * 2, BREAKER_MAX_COOLDOWN_S)
+
+    def _probe_loop_sync(self) -> None:
+        cooldown = BREAKER_COOLDOWN_S
+        while True:
+            time.sleep(cooldown)
+            try:
+                ok = self._probe_sync() is not None
+            except Exception:
+                ok = False
+            if ok:
+                self._close()
+                return
+            cooldown = min(cooldown * 2, BREAKER_MAX_COOLDOWN_S)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "opened": self.opened,
+                "short_circuited": self.short_circuited,
+            }
+
+class Guard:
+    """Breaker + latency tracking + hedging for one backend route."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker(
+            backend.route,
+            probe=lambda: backend.generate(*PROBE_PROMPT),
+            probe_sync=lambda: backend.generate_sync(*PROBE_PROMPT),
+        )
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self) -> float:
+        p95 = self.latency.p95()
+        return max(HEDGE_MIN_DELAY_S, p95 if p95 is not None else HEDGE_DEFAULT_DELAY_S)
+
+    async def generate(self, system_prompt: str, user_prompt: str, mode: Optional[str]) -> Optional[str]:
+        t0 = time.monotonic()
+        try:
+            call = self._hedged(system_prompt, user_prompt) if HEDGE_ENABLED \
+                else self.backend.generate(system_prompt, user_prompt)
+            text = await asyncio.wait_for(call, deadline_for(mode))
+        except asyncio.TimeoutError:
+            self.breaker.record_failure(timeout=True)
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
+        self.latency.add(time.monotonic() - t0)
+        return text
+
+    def generate_sync(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        # sync calls can't be abandoned mid-flight; they only feed the breaker
+        try:
+            text = self.backend.generate_sync(system_prompt, user_prompt)
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return text
+
+    async def _hedged(self, system_prompt: str, user_prompt: str) -> Optional[str]:
+        first = asyncio.ensure_future(self.backend.generate(system_prompt, user_prompt))
+        second = None
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay())
+            if done:
+                return first.result()
+
+            self.hedges_fired += 1
+            second = asyncio.ensure_future(self.backend.generate(system_prompt, user_prompt))
+            pending = {first, second}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None and task.result() is not None:
+                        if task is second:
+                            self.hedges_won += 1
+                        return task.result()
+            return first.result()  # both finished without text: re-raise / None like a single call
+        finally:
+            # also on cancellation (deadline, client gone): neither call may outlive this one
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def stream_first(self, agen, mode: Optional[str]):
+        """Awaits the first chunk of a stream under the mode's deadline (time to first token)."""
+        try:
+            chunk = await asyncio.wait_for(agen.__anext__(), deadline_for(mode))
+        except StopAsyncIteration:
+            self.breaker.record_success()
+            raise
+        except asyncio.TimeoutError:
+            self.breaker.record_failure(timeout=True)
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return chunk
+
+    async def stream_next(self, agen):
+        """Awaits each later chunk, at most STREAM_CHUNK_S after the previous one (a stalled stream fails)."""
+        try:
+            return await asyncio.wait_for(agen.__anext__(), STREAM_CHUNK_S)
+        except StopAsyncIteration:
+            raise
+        except asyncio.TimeoutError:
+            self.breaker.record_failure(timeout=True)
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+    def stats(self) -> dict:
+        p95 = self.latency.p95()
+        return {
+            **self.breaker.stats(),
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedging": HEDGE_ENABLED,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+        }
+
+_guards: Dict[str, Guard] = {}
+
+def guard_for(backend) -> Guard:
+    g = _guards.get(backend.route)
+    if g is None:
+        g = _guards[backend.route] = Guard(backend)
+    return g
+
+def guard_stats() -> Dict[str, dict]:
+    return {route: g.stats() for route, g in _guards.items()}
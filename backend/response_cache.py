@@ -0,0 +1,99 @@
+# backend/response_cache.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# rough per-entry overhead (key digest, tuple, OrderedDict node)
+ENTRY_OVERHEAD = 200
+
+def normalize_user_text(text: str) -> str:
+    """'  Solve integral of  x e^x?? ' -> 'solve integral of x e^x'"""
+    t = " ".join((text or "").lower().split())
+    return t.rstrip(" ?!.")
+
+def cache_key(system_prompt: str, user_text: str, model: str = "") -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(model.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(system_prompt.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(normalize_user_text(user_text).encode("utf-8"))
+    return h.digest()
+
+class ResponseCache:
+    """
+    LRU cache with a TTL, bounded by entry count and (estimated) bytes.
+    Thread-safe so the sync and async LLM paths can share it.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[bytes, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: bytes) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, _ = item
+            if expires_at <= now:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: bytes, value: str) -> None:
+        size = len(value.encode("utf-8")) + ENTRY_OVERHEAD
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl_s, value, size)
+            self._bytes += size
+
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._data))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _drop(self, key: bytes) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "ttl_s": self.ttl_s,
+            }
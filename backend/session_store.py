@@ -1,29 +1,287 @@
+import heapq
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import Dict, List, Literal, Optional
+from typing import Deque, Dict, Iterator, List, Literal, Optional, Tuple
+
+from metrics import SummaryStats
 
 Role = Literal["user", "assistant"]
 
-@dataclass
+# per-session ring-buffer bounds
+HISTORY_MAX = int(os.getenv("SESSION_HISTORY_MAX", "50"))
+QUESTIONS_MAX = int(os.getenv("SESSION_QUESTIONS_MAX", "50"))
+
+# store-wide bounds
+MAX_SESSIONS = int(os.getenv("SESSION_MAX", "50000"))
+MAX_BYTES = int(os.getenv("SESSION_MAX_MB", "256")) * 1024 * 1024
+IDLE_TTL_S = float(os.getenv("SESSION_IDLE_TTL_S", str(6 * 3600)))
+
+# rough fixed costs used by the byte estimate
+SESSION_OVERHEAD = 900  # incl. SummaryStats
+MESSAGE_OVERHEAD = 56
+TURN_BYTES = 5  # mode + score + unlocked + 2 tag ids
+
+@dataclass(slots=True)
 class Message:
     role: Role
     content: str
 
-@dataclass
+def _str_bytes(text: str) -> int:
+    return sys.getsizeof(text)
+
+# ---------------------------
+# Compact turn log
+# ---------------------------
+
+MODES = ["SOCRATIC", "HINT", "FINAL", "REFLECTION", "SUMMARY"]
+_MODE_IDS = {m: i for i, m in enumerate(MODES)}
+
+# tag names are interned into small ids shared by every session (0 = no tag)
+_TAG_NAMES: List[str] = [""]
+_TAG_IDS: Dict[str, int] = {}
+
+def _tag_id(tag: str) -> int:
+    tid = _TAG_IDS.get(tag)
+    if tid is None:
+        tid = len(_TAG_NAMES)
+        _TAG_NAMES.append(tag)
+        _TAG_IDS[tag] = tid
+    return tid
+
+class TurnLog:
+    """
+    Array-backed turn records (~5 bytes per turn instead of a dict each).
+    Iterating yields the same dicts generate_summary() has always consumed.
+    """
+
+    __slots__ = ("modes", "scores", "unlocked", "tags")
+
+    def __init__(self):
+        self.modes = array("B")
+        self.scores = array("B")
+        self.unlocked = array("B")
+        self.tags = array("B")  # two ids per turn; skill_tags() returns at most 2
+
+    def append(self, mode: str, score: int, unlocked: bool, tags: List[str]) -> None:
+        ids = [_tag_id(t) for t in tags[:2]] + [0, 0]
+        self.modes.append(_MODE_IDS[mode])
+        self.scores.append(score)
+        self.unlocked.append(1 if unlocked else 0)
+        self.tags.extend(ids[:2])
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def last_mode(self) -> Optional[str]:
+        return MODES[self.modes[-1]] if self.modes else None
+
+    def record(self, i: int) -> dict:
+        return {
+            "mode": MODES[self.modes[i]],
+            "score": self.scores[i],
+            "unlocked": bool(self.unlocked[i]),
+            "tags": [_TAG_NAMES[t] for t in self.tags[2 * i:2 * i + 2] if t],
+        }
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self.scores)):
+            yield self.record(i)
+
+# ---------------------------
+# Session
+# ---------------------------
+
+@dataclass(slots=True)
 class Session:
     session_id: str
-    history: List[Message] = field(default_factory=list)
-    turns: List[dict] = field(default_factory=list)   # for generate_summary()
-    question_history: List[str] = field(default_factory=list)
+    history: Deque[Message] = field(default_factory=lambda: deque(maxlen=HISTORY_MAX))
+    turns: TurnLog = field(default_factory=TurnLog)
+    stats: SummaryStats = field(default_factory=SummaryStats)  # for generate_summary()
+    question_history: Deque[str] = field(default_factory=lambda: deque(maxlen=QUESTIONS_MAX))
     final_unlocked: bool = False
     task_type: Optional[str] = None
+    last_seen: float = field(default_factory=time.monotonic)
+    nbytes: int = SESSION_OVERHEAD
+    msg_total: int = 0   # messages ever added (history only keeps the tail)
+    q_total: int = 0
+    saved_marks: Tuple[int, int, int] = (0, 0, 0)  # (turns, msg_total, q_total) already persisted
+    # rolling summary of messages older than the LLM context window (see context_builder.py)
+    summary_lines: List[str] = field(default_factory=list)
+    summary_tokens: int = 0
+    folded: int = 0      # messages (by msg_total index) already folded into the summary
+
+    def add_message(self, role: Role, content: str) -> None:
+        if len(self.history) == self.history.maxlen:
+            if self.folded <= self.msg_total - len(self.history):
+                # history[0] is about to fall out of the ring before a prompt build folded it
+                from context_builder import fold_evicted  # imports this module
+                fold_evicted(self)
+            self.nbytes -= _str_bytes(self.history[0].content) + MESSAGE_OVERHEAD
+        self.history.append(Message(role=role, content=content))
+        self.msg_total += 1
+        self.nbytes += _str_bytes(content) + MESSAGE_OVERHEAD
+
+    def add_question(self, text: str) -> None:
+        if len(self.question_history) == self.question_history.maxlen:
+            self.nbytes -= _str_bytes(self.question_history[0])
+        self.question_history.append(text)
+        self.q_total += 1
+        self.nbytes += _str_bytes(text)
+
+    def add_summary_line(self, line: str, tokens: int) -> None:
+        self.summary_lines.append(line)
+        self.summary_tokens += tokens
+        self.nbytes += _str_bytes(line)
+
+    def drop_summary_line(self, i: int, tokens: int) -> None:
+        line = self.summary_lines.pop(i)
+        self.summary_tokens -= tokens
+        self.nbytes -= _str_bytes(line)
+
+    def add_turn(self, mode: str, score: int, unlocked: bool, tags: List[str]) -> None:
+        self.turns.append(mode, score, unlocked, tags)
+        self.stats.add({"mode": mode, "score": score, "unlocked": unlocked, "tags": tags})
+        self.nbytes += TURN_BYTES
+
+def size_breakdown(sessions: List[Session], top: int = 10) -> dict:
+    """
+    Where the session bytes go (same estimates as Session.nbytes), plus the
+    largest sessions. `accounted` vs the component sum shows accounting drift.
+    """
+    parts = {"overhead": 0, "history": 0, "questions": 0, "turns": 0, "summary": 0}
+    accounted = 0
+    for s in sessions:
+        parts["overhead"] += SESSION_OVERHEAD
+        parts["history"] += sum(_str_bytes(m.content) + MESSAGE_OVERHEAD for m in s.history)
+        parts["questions"] += sum(_str_bytes(q) for q in s.question_history)
+        parts["turns"] += len(s.turns) * TURN_BYTES
+        parts["summary"] += sum(_str_bytes(line) for line in s.summary_lines)
+        accounted += s.nbytes
+    largest = heapq.nlargest(top, sessions, key=lambda s: s.nbytes)
+    return {
+        "sessions": len(sessions),
+        "bytes": parts,
+        "accounted": accounted,
+        "largest": [
+            {"session_id": s.session_id, "bytes": s.nbytes, "messages": len(s.history),
+             "turns": len(s.turns), "summary_lines": len(s.summary_lines)}
+            for s in largest
+        ],
+    }
+
+# ---------------------------
+# Store
+# ---------------------------
 
 class SessionStore:
-    def __init__(self):
-        self.sessions: Dict[str, Session] = {}
+    """
+    In-memory sessions with LRU + idle-TTL eviction, capped by count and estimated bytes.
+    Call save() after mutating a session so its size is accounted for.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS, max_bytes: int = MAX_BYTES,
+                 idle_ttl_s: float = IDLE_TTL_S):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_s = idle_ttl_s
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._accounted: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
 
     def get(self, session_id: str) -> Session:
-        if session_id not in self.sessions:
-            self.sessions[session_id] = Session(session_id=session_id)
-        return self.sessions[session_id]
+        now = time.monotonic()
+        with self._lock:
+            s = self.sessions.get(session_id)
+            if s is not None and now - s.last_seen > self.idle_ttl_s:
+                self._drop(session_id)
+                self.expired += 1
+                s = None
+
+            if s is None:
+                s = Session(session_id=session_id)
+                self.sessions[session_id] = s
+                self._account(s)
+            else:
+                self.sessions.move_to_end(session_id)
+
+            s.last_seen = now
+            self._evict(now, keep=session_id)
+            return s
+
+    def save(self, s: Session) -> None:
+        with self._lock:
+            if s.session_id not in self.sessions:
+                return
+            self._account(s)
+            self._evict(time.monotonic(), keep=s.session_id)
+
+    def _account(self, s: Session) -> None:
+        self._bytes += s.nbytes - self._accounted.get(s.session_id, 0)
+        self._accounted[s.session_id] = s.nbytes
+
+    def _drop(self, session_id: str) -> None:
+        del self.sessions[session_id]
+        self._bytes -= self._accounted.pop(session_id)
+
+    def _evict(self, now: float, keep: str) -> None:
+        # idle sessions sit at the LRU end, so stop at the first fresh one
+        while self.sessions:
+            sid, oldest = next(iter(self.sessions.items()))
+            if sid == keep or now - oldest.last_seen <= self.idle_ttl_s:
+                break
+            self._drop(sid)
+            self.expired += 1
+
+        while len(self.sessions) > 1 and (
+            len(self.sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            sid = next(iter(self.sessions))
+            if sid == keep:
+                break
+            self._drop(sid)
+            self.evicted += 1
+
+    def close(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    @property
+    def approx_bytes(self) -> int:
+        return self._bytes
+
+    def breakdown(self, top: int = 10) -> dict:
+        with self._lock:
+            sessions = list(self.sessions.values())
+        return size_breakdown(sessions, top)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self.sessions),
+                "approx_bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "idle_ttl_s": self.idle_ttl_s,
+                "evicted": self.evicted,
+                "expired": self.expired,
+            }
+
+def make_store():
+    """SESSION_BACKEND=memory (default) or sqlite (durable, shared by workers on one host)."""
+    backend = os.getenv("SESSION_BACKEND", "memory")
+    if backend == "sqlite":
+        from sqlite_store import SQLiteSessionStore
+        return SQLiteSessionStore(os.getenv("SESSION_DB", "sessions.db"))
+    return SessionStore()
 
-store = SessionStore()
+store = make_store()
@@ -0,0 +1,149 @@
+# backend/single_flight.py
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class LeaderCancelled(Exception):
+    """Set on a flight whose leader was cancelled: its followers make the call again."""
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one upstream call.
+
+    The first caller (leader) runs the call; everyone who asks for the same key
+    while it is in flight -- or up to `window_s` after it finished -- gets the
+    leader's result instead of making their own call. In-flight calls are plain
+    concurrent.futures.Futures, so sync threads and async tasks (on any loop)
+    can join each other's flights.
+
+    A follower that is cancelled only stops waiting; the flight goes on for the
+    others. If the leader is cancelled, the flight is dropped and its followers
+    start over (one of them leads the retry).
+    """
+
+    def __init__(self, window_s: float = 0.0):
+        self.window_s = window_s
+        self._flights: Dict[Hashable, Tuple[Future, Optional[float]]] = {}  # key -> (future, done_at)
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.collapsed = 0       # callers that shared someone else's call
+        self.window_hits = 0     # ... of which joined after it had already finished
+
+    def _join_or_lead(self, key: Hashable) -> Tuple[Future, bool]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._flights.get(key)
+            if entry is not None:
+                fut, done_at = entry
+                if done_at is None or now - done_at <= self.window_s:
+                    self.collapsed += 1
+                    if done_at is not None:
+                        self.window_hits += 1
+                    return fut, False
+
+            self._sweep(now)
+            fut = Future()
+            self._flights[key] = (fut, None)
+            self.leaders += 1
+            return fut, True
+
+    def _finish(self, key: Hashable, fut: Future, reusable: bool = True) -> None:
+        with self._lock:
+            if self._flights.get(key, (None,))[0] is not fut:
+                return
+            if reusable and self.window_s > 0:
+                self._flights[key] = (fut, time.monotonic())
+            else:
+                del self._flights[key]
+
+    def _sweep(self, now: float) -> None:
+        # finished flights whose window has passed (caller holds the lock)
+        expired = [k for k, (_, done_at) in self._flights.items()
+                   if done_at is not None and now - done_at > self.window_s]
+        for k in expired:
+            del self._flights[k]
+
+    @staticmethod
+    def _settle(fut: Future, result=None, error: Optional[BaseException] = None) -> None:
+        if fut.done():  # nothing can cancel it (followers wait through a shield), but never raise here
+            return
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    async def join_async(self, key: Hashable) -> Optional[T]:
+        """The result of a flight already under way (or in its window) for `key`; None if there is none."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._flights.get(key)
+            if entry is None or (entry[1] is not None and now - entry[1] > self.window_s):
+                return None
+            fut = entry[0]
+            self.collapsed += 1
+            if entry[1] is not None:
+                self.window_hits += 1
+        try:
+            return await asyncio.shield(asyncio.wrap_future(fut))
+        except Exception:  # the leader failed or was cancelled: the caller makes its own call
+            return None
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        while True:
+            fut, leader = self._join_or_lead(key)
+            if not leader:
+                try:
+                    # shielded: a cancelled follower must not cancel the shared future
+                    return await asyncio.shield(asyncio.wrap_future(fut))
+                except LeaderCancelled:
+                    continue
+            break
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # the leader's request went away; the followers still want an answer
+            self._finish(key, fut, reusable=False)
+            self._settle(fut, error=LeaderCancelled())
+            raise
+        except BaseException as e:
+            self._finish(key, fut)
+            self._settle(fut, error=e)
+            raise
+        self._finish(key, fut)
+        self._settle(fut, result)
+        return result
+
+    def do_sync(self, key: Hashable, fn: Callable[[], T]) -> T:
+        while True:
+            fut, leader = self._join_or_lead(key)
+            if not leader:
+                try:
+                    return fut.result()
+                except LeaderCancelled:
+                    continue
+            break
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, fut)
+            self._settle(fut, error=e)
+            raise
+        self._finish(key, fut)
+        self._settle(fut, result)
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "in_flight": sum(1 for _, done_at in self._flights.values() if done_at is None),
+                "leaders": self.leaders,
+                "collapsed": self.collapsed,
+                "window_hits": self.window_hits,
+                "window_s": self.window_s,
+            }
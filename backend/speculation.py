@@ -0,0 +1,178 @@
+# backend/speculation.py
+"""
+Speculative prefetch of a session's next tutor reply.
+
+Students tend to ask for a HINT right after a SOCRATIC reply, and for FINAL
+soon after the answer unlocks. After a turn is answered we generate that
+predicted reply in the background (only on idle LLM capacity, see
+admission.SPECULATIVE) and park it in a per-session slot. If the session's
+very next turn asks for that mode about the same question, it is served from
+the slot instead of waiting for a fresh LLM round trip.
+
+    SPECULATE=1                  enable (off by default: it spends LLM calls on guesses)
+    SPECULATE_MODES=HINT,FINAL   modes that may be prefetched
+    SPECULATE_TTL_S=120          a prefetched reply older than this is thrown away
+    SPECULATE_MAX_MB=8           memory cap over all slots (oldest dropped first)
+    SPECULATE_PER_MIN=60         budget: speculative LLM calls per minute (bursts up to the same)
+    SPECULATE_FOLLOWUP_WORDS=6   "hint pls"-style follow-ups (this many words, no numbers) match too
+"""
+import asyncio
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from admission import TokenBucket
+from response_cache import normalize_user_text
+
+ENABLED = os.getenv("SPECULATE", "0") == "1"
+MODES = set(filter(None, os.getenv("SPECULATE_MODES", "HINT,FINAL").split(",")))
+TTL_S = float(os.getenv("SPECULATE_TTL_S", "120"))
+MAX_BYTES = int(float(os.getenv("SPECULATE_MAX_MB", "8")) * 1024 * 1024)
+PER_MIN = float(os.getenv("SPECULATE_PER_MIN", "60"))
+FOLLOWUP_WORDS = int(os.getenv("SPECULATE_FOLLOWUP_WORDS", "6"))
+
+SLOT_OVERHEAD = 400  # slot object, task and question string, roughly
+
+_DIGIT_RE = re.compile(r"\d")
+
+def predict(mode: str, final_unlocked: bool) -> Optional[str]:
+    """The mode this session most likely asks for next, after a `mode` turn."""
+    if final_unlocked and mode != "FINAL":
+        return "FINAL"
+    if mode == "SOCRATIC":
+        return "HINT"
+    return None
+
+def is_follow_up(question: str, text: str) -> bool:
+    """The new message asks about the same question: repeated, or too short to be a new one."""
+    t = normalize_user_text(text)
+    return t == question or (len(t.split()) <= FOLLOWUP_WORDS and not _DIGIT_RE.search(t))
+
+class Slot:
+    __slots__ = ("mode", "question", "msg_total", "task", "created", "nbytes")
+
+    def __init__(self, mode: str, question: str, msg_total: int, task: asyncio.Task, created: float):
+        self.mode, self.question, self.msg_total = mode, question, msg_total
+        self.task, self.created = task, created
+        self.nbytes = SLOT_OVERHEAD + sys.getsizeof(question)
+
+class Speculator:
+    """One slot per session, LRU-ordered, bounded by TTL and total bytes. Single event loop."""
+
+    def __init__(self):
+        self._slots: "OrderedDict[str, Slot]" = OrderedDict()
+        self._bytes = 0
+        self.budget = TokenBucket(PER_MIN / 60, PER_MIN, time.monotonic())
+        self.counts: Dict[str, int] = {
+            "started": 0, "hit": 0, "miss": 0, "expired": 0, "evicted": 0,
+            "over_budget": 0, "no_reply": 0,
+        }
+        self.saved_s = 0.0   # LLM time the hits didn't have to wait for
+
+    def _drop(self, session_id: str, outcome: Optional[str]) -> Optional[Slot]:
+        slot = self._slots.pop(session_id, None)
+        if slot is None:
+            return None
+        self._bytes -= slot.nbytes
+        if outcome:
+            slot.task.cancel()
+            self.counts[outcome] += 1
+        return slot
+
+    def _trim(self, now: float) -> None:
+        while self._slots:
+            sid, oldest = next(iter(self._slots.items()))
+            if now - oldest.created > TTL_S:
+                self._drop(sid, "expired")
+            elif self._bytes > MAX_BYTES:
+                self._drop(sid, "evicted")
+            else:
+                break
+
+    def start(self, session_id: str, mode: str, question: str, msg_total: int,
+              generate: Callable[[], Awaitable[Optional[str]]]) -> bool:
+        """
+        Prefetch `generate()` as this session's `mode` reply to `question`.
+        `msg_total` is the session's message count now; the slot is only good
+        for the very next turn.
+        """
+        now = time.monotonic()
+        self._drop(session_id, "miss")  # the previous guess was never asked for
+        self._trim(now)
+        if not self.budget.take(now):
+            self.counts["over_budget"] += 1
+            return False
+
+        task = asyncio.create_task(self._run(session_id, generate))
+        slot = Slot(mode, normalize_user_text(question), msg_total, task, now)
+        self._slots[session_id] = slot
+        self._bytes += slot.nbytes
+        self.counts["started"] += 1
+        return True
+
+    async def _run(self, session_id: str, generate) -> Optional[tuple]:
+        t0 = time.monotonic()
+        try:
+            reply = await generate()
+        except Exception as e:
+            print("SPECULATION FAILED:", repr(e))
+            reply = None
+        slot = self._slots.get(session_id)
+        if reply is None:
+            if slot is not None and slot.task is asyncio.current_task():
+                self._drop(session_id, None)
+                self.counts["no_reply"] += 1
+            return None
+        if slot is not None and slot.task is asyncio.current_task():
+            grown = sys.getsizeof(reply)
+            slot.nbytes += grown
+            self._bytes += grown
+            self._trim(time.monotonic())
+        return reply, time.monotonic() - t0
+
+    async def take(self, session_id: str, mode: str, text: str, msg_total: int) -> Optional[str]:
+        """The prefetched reply if this turn is the one we guessed, else None (and the guess is dropped)."""
+        slot = self._slots.get(session_id)
+        if slot is None:
+            return None
+        if time.monotonic() - slot.created > TTL_S:
+            self._drop(session_id, "expired")
+            return None
+        # begin_turn() has added this turn's message: nothing else happened in between
+        if slot.mode != mode or slot.msg_total + 1 != msg_total or not is_follow_up(slot.question, text):
+            self._drop(session_id, "miss")
+            return None
+
+        self._drop(session_id, None)
+        t0 = time.monotonic()
+        try:
+            out = await asyncio.shield(slot.task)  # may still be in flight: wait for it, don't restart
+        except asyncio.CancelledError:
+            if not slot.task.done():
+                slot.task.cancel()
+            raise
+        if out is None:
+            self.counts["no_reply"] += 1
+            return None
+        reply, generation_s = out
+        self.counts["hit"] += 1
+        self.saved_s += max(0.0, generation_s - (time.monotonic() - t0))
+        return reply
+
+    def stats(self) -> dict:
+        guessed = self.counts["hit"] + self.counts["miss"] + self.counts["expired"] + self.counts["evicted"]
+        return {
+            "enabled": ENABLED,
+            "modes": sorted(MODES),
+            "slots": len(self._slots),
+            "approx_bytes": self._bytes,
+            **self.counts,
+            "hit_rate": round(self.counts["hit"] / guessed, 3) if guessed else 0.0,
+            "saved_s": round(self.saved_s, 3),
+            "budget_per_min": PER_MIN,
+        }
+
+speculator = Speculator()
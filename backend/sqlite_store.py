@@ -0,0 +1,331 @@
+# backend/sqlite_store.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from session_store import HISTORY_MAX, QUESTIONS_MAX, Session, size_breakdown
+
+log = logging.getLogger(__name__)
+
+# write-behind: turns are queued by save() and written by one background thread
+FLUSH_INTERVAL_S = float(os.getenv("SESSION_DB_FLUSH_MS", "50")) / 1000
+BATCH_MAX = int(os.getenv("SESSION_DB_BATCH_MAX", "500"))
+RETRY_S = float(os.getenv("SESSION_DB_RETRY_MS", "500")) / 1000  # pause after a failed batch before retrying it
+
+# small read cache; short TTL so other workers' writes show up quickly
+CACHE_MAX = int(os.getenv("SESSION_CACHE_MAX", "10000"))
+CACHE_TTL_S = float(os.getenv("SESSION_CACHE_TTL_S", "2"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id     TEXT PRIMARY KEY,
+    final_unlocked INTEGER NOT NULL DEFAULT 0,
+    task_type      TEXT,
+    updated_at     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS turns (
+    id         INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    mode       TEXT NOT NULL,
+    score      INTEGER NOT NULL,
+    unlocked   INTEGER NOT NULL,
+    tags       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_by_session ON turns(session_id, id);
+CREATE TABLE IF NOT EXISTS messages (
+    id         INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    role       TEXT NOT NULL,
+    content    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_session ON messages(session_id, id);
+CREATE TABLE IF NOT EXISTS questions (
+    id         INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    text       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS questions_by_session ON questions(session_id, id);
+"""
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: durable across app crashes
+    conn.execute("PRAGMA busy_timeout=10000")
+    return conn
+
+class SQLiteSessionStore:
+    """
+    Durable SessionStore on SQLite (WAL), safe to share between worker processes on one host.
+
+    - get() serves from a small LRU read cache and loads from the DB on a miss.
+    - save() only queues the new turns/messages; a background thread writes them
+      in batched transactions, so /chat never waits on fsync.
+    - Appends use rowids and the unlock flag only ever goes 0 -> 1, so workers
+      writing the same session don't conflict. A write from another worker shows
+      up here once its batch is flushed and our cached copy is older than CACHE_TTL_S.
+    """
+
+    def __init__(self, path: str, cache_max: int = CACHE_MAX, cache_ttl_s: float = CACHE_TTL_S):
+        self.path = path
+        self.cache_max = cache_max
+        self.cache_ttl_s = cache_ttl_s
+
+        self._read = _connect(path)
+        self._read.executescript(SCHEMA)
+        self._read_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[Session, float]]" = OrderedDict()
+        self._dirty: Dict[str, int] = {}  # session_id -> queued ops not yet written
+        self._pending: Dict[str, List[tuple]] = {"sessions": [], "turns": [], "messages": [], "questions": []}
+        self._pending_n = 0
+
+        self._wake = threading.Condition(self._lock)
+        self._stop = False
+        self.flushes = 0
+        self.rows_written = 0
+        self.write_failures = 0
+        self.hits = 0
+        self.misses = 0
+
+        self._writer = threading.Thread(target=self._flush_loop, name="session-writer", daemon=True)
+        self._writer.start()
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+
+    def get(self, session_id: str) -> Session:
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                s, loaded_at = cached
+                # never reload over our own unflushed writes
+                if now - loaded_at <= self.cache_ttl_s or self._dirty.get(session_id):
+                    self._cache.move_to_end(session_id)
+                    self.hits += 1
+                    s.last_seen = now
+                    return s
+            self.misses += 1
+
+        s = self._load(session_id)
+        with self._lock:
+            self._cache[session_id] = (s, now)
+            self._cache.move_to_end(session_id)
+            while len(self._cache) > self.cache_max:
+                sid = next(iter(self._cache))
+                if self._dirty.get(sid):
+                    self._cache.move_to_end(sid)
+                    break
+                del self._cache[sid]
+        return s
+
+    def _load(self, session_id: str) -> Session:
+        s = Session(session_id=session_id)
+        with self._read_lock:
+            row = self._read.execute(
+                "SELECT final_unlocked, task_type FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            turns = self._read.execute(
+                "SELECT mode, score, unlocked, tags FROM turns WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+            messages = self._read.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, HISTORY_MAX),
+            ).fetchall()
+            questions = self._read.execute(
+                "SELECT text FROM questions WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, QUESTIONS_MAX),
+            ).fetchall()
+
+        if row:
+            s.final_unlocked = bool(row[0])
+            s.task_type = row[1]
+        for mode, score, unlocked, tags in turns:
+            s.add_turn(mode, score, bool(unlocked), tags.split(",") if tags else [])
+        for role, content in reversed(messages):
+            s.add_message(role, content)
+        for (text,) in reversed(questions):
+            s.add_question(text)
+
+        s.saved_marks = (len(s.turns), s.msg_total, s.q_total)
+        return s
+
+    # ---------------------------
+    # Writes (write-behind)
+    # ---------------------------
+
+    def save(self, s: Session) -> None:
+        sid = s.session_id
+        saved_turns, saved_msgs, saved_qs = s.saved_marks
+
+        new_turns = [s.turns.record(i) for i in range(saved_turns, len(s.turns))]
+        n_msgs = min(s.msg_total - saved_msgs, len(s.history))
+        n_qs = min(s.q_total - saved_qs, len(s.question_history))
+        new_msgs = list(s.history)[len(s.history) - n_msgs:] if n_msgs else []
+        new_qs = list(s.question_history)[len(s.question_history) - n_qs:] if n_qs else []
+        s.saved_marks = (len(s.turns), s.msg_total, s.q_total)
+
+        with self._lock:
+            p = self._pending
+            p["sessions"].append((sid, int(s.final_unlocked), s.task_type, time.time()))
+            p["turns"].extend(
+                (sid, t["mode"], t["score"], int(t["unlocked"]), ",".join(t["tags"])) for t in new_turns
+            )
+            p["messages"].extend((sid, m.role, m.content) for m in new_msgs)
+            p["questions"].extend((sid, q) for q in new_qs)
+
+            n = 1 + len(new_turns) + len(new_msgs) + len(new_qs)
+            self._pending_n += n
+            self._dirty[sid] = self._dirty.get(sid, 0) + n
+            if self._pending_n >= BATCH_MAX:
+                self._wake.notify()
+
+    def _flush_loop(self) -> None:
+        conn = _connect(self.path)
+        while True:
+            with self._lock:
+                if not self._stop and self._pending_n < BATCH_MAX:
+                    self._wake.wait(FLUSH_INTERVAL_S)
+                batch, self._pending = self._pending, {k: [] for k in self._pending}
+                self._pending_n = 0
+                stop = self._stop
+
+            # the thread must outlive any failure, or save() would only ever mark sessions dirty
+            try:
+                if any(batch.values()) and not self._write(conn, batch) and not stop:
+                    time.sleep(RETRY_S)
+            except Exception:
+                log.exception("session writer loop failed")
+                time.sleep(RETRY_S)
+            if stop:
+                conn.close()
+                return
+
+    def _requeue(self, batch: Dict[str, List[tuple]]) -> None:
+        # ahead of anything queued since, so rows keep their order
+        with self._lock:
+            for k, rows in batch.items():
+                self._pending[k] = rows + self._pending[k]
+            self._pending_n += sum(len(rows) for rows in batch.values())
+
+    def _write(self, conn: sqlite3.Connection, batch: Dict[str, List[tuple]]) -> bool:
+        """Write one batch in a transaction. On failure it is queued again (sessions stay dirty)."""
+        touched = {row[0] for rows in batch.values() for row in rows}
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                """
+                INSERT INTO sessions (session_id, final_unlocked, task_type, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    final_unlocked = MAX(final_unlocked, excluded.final_unlocked),
+                    task_type = COALESCE(excluded.task_type, task_type),
+                    updated_at = excluded.updated_at
+                """,
+                batch["sessions"],
+            )
+            conn.executemany(
+                "INSERT INTO turns (session_id, mode, score, unlocked, tags) VALUES (?, ?, ?, ?, ?)",
+                batch["turns"],
+            )
+            conn.executemany("INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)", batch["messages"])
+            conn.executemany("INSERT INTO questions (session_id, text) VALUES (?, ?)", batch["questions"])
+
+            # keep the DB copies of the ring buffers bounded too
+            for table, keep in (("messages", HISTORY_MAX), ("questions", QUESTIONS_MAX)):
+                conn.executemany(
+                    f"""
+                    DELETE FROM {table} WHERE session_id = ? AND id < (
+                        SELECT MIN(id) FROM (
+                            SELECT id FROM {table} WHERE session_id = ? ORDER BY id DESC LIMIT ?
+                        )
+                    )
+                    """,
+                    [(sid, sid, keep) for sid in touched],
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            log.exception("session DB write failed; %d rows will be retried", sum(len(r) for r in batch.values()))
+            if conn.in_transaction:
+                try:
+                    conn.execute("ROLLBACK")
+                except sqlite3.Error:
+                    log.exception("session DB rollback failed")
+            with self._lock:
+                self.write_failures += 1
+            self._requeue(batch)
+            return False
+        else:
+            written = sum(len(rows) for rows in batch.values())
+            with self._lock:
+                self.flushes += 1
+                self.rows_written += written
+                for rows in batch.values():
+                    for row in rows:
+                        left = self._dirty.get(row[0], 0) - 1
+                        if left > 0:
+                            self._dirty[row[0]] = left
+                        else:
+                            self._dirty.pop(row[0], None)
+            return True
+
+    def flush(self) -> None:
+        """Write everything queued so far (used on shutdown)."""
+        with self._lock:
+            batch, self._pending = self._pending, {k: [] for k in self._pending}
+            self._pending_n = 0
+        if any(batch.values()):
+            conn = _connect(self.path)
+            self._write(conn, batch)
+            conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._stop = True
+            self._wake.notify()
+        self._writer.join(timeout=5)
+        self.flush()
+
+    # ---------------------------
+    # Sizing
+    # ---------------------------
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def approx_bytes(self) -> int:
+        with self._lock:
+            return sum(s.nbytes for s, _ in self._cache.values())
+
+    def breakdown(self, top: int = 10) -> dict:
+        """Sizes of the sessions held in the read cache (the DB rows aren't in memory)."""
+        with self._lock:
+            sessions = [s for s, _ in self._cache.values()]
+        return size_breakdown(sessions, top)
+
+    def stats(self) -> dict:
+        with self._read_lock:
+            db_sessions = self._read.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        with self._lock:
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "sessions": len(self._cache),
+                "db_sessions": db_sessions,
+                "approx_bytes": sum(s.nbytes for s, _ in self._cache.values()),
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "pending_rows": self._pending_n,
+                "flushes": self.flushes,
+                "rows_written": self.rows_written,
+                "write_failures": self.write_failures,
+            }
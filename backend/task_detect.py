@@ -1,12 +1,175 @@
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Pattern, Tuple, Union
+
+from metrics import MAX_SCAN_CHARS
+
+# built-in vocabulary, used when task_vocab.json is missing or broken
 MATH = ["integral","derivative","solve","simplify","limit","proof","equation","matrix","vector","probability","statistics"]
 WRITING = ["essay","thesis","introduction","conclusion","paragraph","outline","citation","argument","rewrite","rephrase"]
 EXPLAIN = ["explain","define","summarize","difference","how","why","what is"]
 
+TASK_TYPES = ["math", "writing", "explain"]
+
+VOCAB_PATH = os.getenv("TASK_VOCAB", os.path.join(os.path.dirname(os.path.abspath(__file__)), "task_vocab.json"))
+VOCAB_CHECK_S = float(os.getenv("TASK_VOCAB_CHECK_S", "5"))
+
+_WORD_RE = re.compile(r"\w+")
+
+# "what is"   -> whole words, in sequence
+# "integral*" -> any word starting with "integral" (integral, integrals)
+# ["proof", 2] -> weighted keyword
+Keyword = Union[str, List]
+
+def _trie_pattern(words) -> str:
+    """Regex alternation of `words` shaped as a prefix trie (integ(?:ral|rate)), so it scans like an automaton."""
+    trie: dict = {}
+    for w in words:
+        node = trie
+        for ch in w:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        alts = [re.escape(ch) + emit(sub) for ch, sub in sorted(node.items()) if ch]
+        if not alts:
+            return ""
+        if len(alts) == 1 and "" not in node:
+            return alts[0]
+        return "(?:" + "|".join(alts) + ")" + ("?" if "" in node else "")
+
+    return emit(trie)
+
+class TaskClassifier:
+    """
+    One C-level regex pass, compiled from the whole vocabulary as a trie, pulls out
+    only the words that could start a keyword (a keyword's first word, or a word
+    beginning with a prefix keyword's stem); those few candidates are then matched
+    with dict lookups. The cost is one scan of the text, whatever the vocabulary size.
+    Each keyword counts once per text, with its weight.
+    """
+
+    def __init__(self, vocab: Dict[str, List[Keyword]]):
+        self.weights: List[Tuple[str, float]] = []   # keyword id -> (task_type, weight)
+        self.words: Dict[str, List[int]] = {}        # word -> keyword ids
+        self.prefixes: Dict[int, Dict[str, List[int]]] = {}  # prefix length -> prefix -> keyword ids
+        self.phrases: Dict[Tuple[str, ...], Tuple[Pattern, List[int]]] = {}  # words -> (regex, keyword ids)
+
+        for task_type, keywords in vocab.items():
+            if task_type not in TASK_TYPES:
+                raise ValueError(f"unknown task type in vocabulary: {task_type!r}")
+            for kw in keywords:
+                phrase, weight = (kw, 1.0) if isinstance(kw, str) else (kw[0], float(kw[1]))
+                self._add(phrase.lower().strip(), task_type, weight)
+
+        heads = set(self.words) | {words[0] for words in self.phrases}
+        heads.update(stem for stems in self.prefixes.values() for stem in stems)
+        # whole words starting with a head (\b then a word char is always the start of a token)
+        self._candidates = re.compile(r"\b" + _trie_pattern(heads) + r"\w*") if heads else re.compile(r"(?!)")
+
+    def _add(self, phrase: str, task_type: str, weight: float) -> None:
+        kid = len(self.weights)
+        self.weights.append((task_type, weight))
+
+        if phrase.endswith("*"):
+            stem = phrase[:-1]
+            if not _WORD_RE.fullmatch(stem):
+                raise ValueError(f"prefix keywords must be a single word: {phrase!r}")
+            self.prefixes.setdefault(len(stem), {}).setdefault(stem, []).append(kid)
+            return
+
+        words = tuple(_WORD_RE.findall(phrase))
+        if not words:
+            raise ValueError(f"empty keyword for {task_type!r}")
+        if len(words) == 1:
+            self.words.setdefault(words[0], []).append(kid)
+            return
+        if words not in self.phrases:
+            # consecutive tokens: the words separated only by non-word characters. The
+            # pattern starts with the literal first word (re scans for that fast), and the
+            # lookbehind after it checks it starts a token
+            head = re.escape(words[0])
+            rx = re.compile(head + r"(?<!\w" + head + ")" + "".join(r"\W+" + re.escape(w) for w in words[1:]) + r"(?!\w)")
+            self.phrases[words] = (rx, [])
+        self.phrases[words][1].append(kid)
+
+    def scores(self, text: str) -> Dict[str, float]:
+        seen = set(self._candidates.findall(text))
+        matched = set()
+
+        for w in seen:
+            matched.update(self.words.get(w, ()))
+            for n, stems in self.prefixes.items():
+                matched.update(stems.get(w[:n], ()))
+        for words, (rx, kids) in self.phrases.items():
+            if words[0] in seen and rx.search(text):
+                matched.update(kids)
+
+        totals = {t: 0.0 for t in TASK_TYPES}
+        for kid in matched:
+            task_type, weight = self.weights[kid]
+            totals[task_type] += weight
+        return totals
+
+DEFAULT_VOCAB: Dict[str, List[Keyword]] = {"math": MATH, "writing": WRITING, "explain": EXPLAIN}
+
+# ---------------------------
+# Vocabulary loading / hot reload
+# ---------------------------
+
+_lock = threading.Lock()
+_classifier = TaskClassifier(DEFAULT_VOCAB)
+_loaded_mtime = None
+_next_check = 0.0
+
+def load_vocab(path: str = VOCAB_PATH) -> TaskClassifier:
+    with open(path, encoding="utf-8") as f:
+        return TaskClassifier(json.load(f))
+
+def _reload_locked(force: bool) -> bool:
+    global _classifier, _loaded_mtime, _next_check
+    _next_check = time.monotonic() + VOCAB_CHECK_S
+    try:
+        mtime = os.stat(VOCAB_PATH).st_mtime
+    except OSError:
+        return False
+    if not force and mtime == _loaded_mtime:
+        return False
+
+    try:
+        _classifier = load_vocab(VOCAB_PATH)
+    except Exception as e:
+        print("TASK VOCAB LOAD FAILED:", repr(e))
+        _loaded_mtime = mtime  # don't retry a broken file until it changes again
+        return False
+    _loaded_mtime = mtime
+    return True
+
+def reload_vocab(force: bool = False) -> bool:
+    """Swap in a new classifier if the vocabulary file changed. Returns True if reloaded."""
+    with _lock:
+        return _reload_locked(force)
+
+def _maybe_reload() -> None:
+    # one caller per TASK_VOCAB_CHECK_S pays for the stat; the others don't wait for it
+    if not _lock.acquire(blocking=False):
+        return
+    try:
+        if time.monotonic() >= _next_check:
+            _reload_locked(False)
+    finally:
+        _lock.release()
+
 def detect_task_type(text: str) -> str:
-    t = (text or "").lower()
-    mh = sum(k in t for k in MATH)
-    wh = sum(k in t for k in WRITING)
-    eh = sum(k in t for k in EXPLAIN)
+    if time.monotonic() >= _next_check:
+        _maybe_reload()
+
+    t = (text or "")[:MAX_SCAN_CHARS].lower()
+    totals = _classifier.scores(t)
+    mh, wh, eh = totals["math"], totals["writing"], totals["explain"]
 
     if mh >= wh and mh >= eh and mh > 0:
         return "math"
@@ -0,0 +1,190 @@
+# backend/telemetry.py
+"""
+In-process metrics: counters, gauges and latency histograms, exposed in the
+Prometheus text format at /metrics, plus per-request stage timings that go out
+in a Server-Timing header.
+
+    with stage("llm"):
+        ...
+
+Recording a stage is one perf_counter pair, a bisect and a dict update, so it
+stays on in production.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+# seconds; covers sub-ms scoring stages up to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _fmt_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, v in self._values.items():
+                lines.append(f"{self.name}{_fmt_labels(labels)} {v:g}")
+        return lines
+
+class Gauge:
+    """Read at scrape time from a callback returning {labels-tuple: value}."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], Dict[Labels, float]]):
+        self.name, self.help, self.read = name, help, read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.read()
+        except Exception as e:
+            print("METRICS GAUGE FAILED:", self.name, repr(e))
+            values = {}
+        for labels, v in values.items():
+            lines.append(f"{self.name}{_fmt_labels(labels)} {v:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.buckets = tuple(buckets)
+        self._series: Dict[Labels, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 3)  # buckets, +Inf, sum, count
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(s)) for labels, s in self._series.items()]
+        for labels, s in series:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_fmt_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_fmt_labels(labels)} {s[-2]:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(labels)} {s[-1]}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self.register(Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], Dict[Labels, float]]) -> Gauge:
+        return self.register(Gauge(name, help, read))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram("cooked_stage_seconds", "Time spent in each /chat pipeline stage.")
+REQUEST_SECONDS = registry.histogram("cooked_request_seconds", "HTTP request latency by route (to response start).")
+LLM_CALLS = registry.counter("cooked_llm_calls_total", "LLM calls by mode and outcome (ok|fallback).")
+FALLBACKS = registry.counter("cooked_fallbacks_total", "Turns answered with a fallback reply, by mode.")
+SHED = registry.counter("cooked_shed_total", "Turns answered with a fallback by admission control, by reason.")
+FINAL_LOCKS = registry.counter("cooked_final_locks_total", "FINAL requests downgraded to SOCRATIC because final was locked.")
+
+# ---------------------------
+# Per-request stage timings (Server-Timing)
+# ---------------------------
+
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("timings", default=None)
+
+@contextmanager
+def stage(name: str):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - t0)
+
+def record_stage(name: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+def detach_request_timings() -> None:
+    """Stop collecting Server-Timing entries in this task (stages still feed the histograms)."""
+    _timings.set(None)
+
+def server_timing(timings: List[Tuple[str, float]], total_s: float) -> str:
+    parts = [f"{name};dur={s * 1000:.2f}" for name, s in timings]
+    parts.append(f"total;dur={total_s * 1000:.2f}")
+    return ", ".join(parts)
+
+class TimingMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware task hop): collects the stage
+    timings of one request and adds them as a Server-Timing header. Streaming
+    responses only carry the stages that ran before their first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings: List[Tuple[str, float]] = []
+        token = _timings.set(timings)
+        t0 = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - t0
+                route = scope.get("route")
+                REQUEST_SECONDS.observe(total, route=getattr(route, "path", "other"))
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings, total).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _timings.reset(token)
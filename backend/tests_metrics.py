@@ -1,5 +1,8 @@
 # app/tests_metrics.py
-from metrics import EffortMetrics, compute_effort_score, skill_tags, reliance_index, generate_summary
+import random
+
+from metrics import EffortMetrics, compute_effort_score, skill_tags, reliance_index, generate_summary, scan_text, DraftScorer
+import task_detect
 
 def simulate():
     cases = {
@@ -32,5 +35,85 @@ def simulate():
 
         print("SUMMARY:", generate_summary(turns))
 
+WORDS = ["if", "then", "because", "so", "step", "what", "is", "use", "the", "formula", "plug", "in",
+         "break", "down", "trade", "off", "why", "solve", "pros", "define", "x", "2", "3.5", "é", "İF"]
+SEPS = [" ", " ", ". ", "!", "?", "...", "\n", "\n-", "\n1.", "-", "->", "=", ","]
+
+def random_text(rng, words):
+    return "".join(rng.choice(WORDS) + rng.choice(SEPS) for _ in range(words))
+
+def check_draft_scorer(trials=300, edits=60, seed=0):
+    """DraftScorer must agree with compute_effort_score/scan_text after every random edit."""
+    rng = random.Random(seed)
+    for _ in range(trials):
+        d, ref = DraftScorer(), ""
+        for _ in range(edits):
+            start = rng.randint(0, len(ref))
+            end = start if rng.random() < 0.6 else rng.randint(start, min(len(ref), start + 6))
+            text = random_text(rng, rng.randint(0, 2))[:rng.randint(0, 8)]
+            d.replace(start, end, text)
+            ref = ref[:start] + text + ref[end:]
+
+            m = EffortMetrics(len(ref), rng.randint(0, 90000), rng.randint(0, 20), rng.randint(0, 3),
+                              rng.randint(0, 3), rng.randint(0, 2))
+            got, want = d.features(), scan_text(ref)
+            assert d.text == ref
+            assert (got.tag_scores, got.structure) == (want.tag_scores, want.structure), repr(ref)
+            assert d.score(m) == compute_effort_score(ref, m), repr(ref)
+    print(f"DraftScorer matches compute_effort_score on {trials * edits} random edits")
+
+# inputs the task_vocab.json classifier labels differently from the old substring
+# keywords (old label in the comment): whole words, a larger vocabulary, weights
+TASK_CHANGES = {
+    "solved?": "explain",                              # math: "solve" inside "solved"
+    "help me proofread my draft": "writing",           # math: "proof" inside "proofread"
+    "show that sin^2+cos^2=1": "math",                 # explain: "how" inside "show"
+    "prove the theorem about triangles": "math",       # explain
+    "I need help with my algebra homework": "math",    # explain
+    "What are fractions": "math",                      # explain
+    "grammar check": "writing",                        # explain
+}
+TASK_SAME = {
+    "Solve x^2+3x=0": "math", "Explain integrals": "math", "what is a derivative": "math",
+    "Write an essay outline": "writing", "Rewrite my cover letter": "writing",
+    "Why does this essay need a thesis?": "writing", "Can you show me the steps?": "explain",
+    "what's the meaning of this poem": "explain", "whatever is fine": "explain",
+}
+
+def reference_scores(vocab, text):
+    """Keyword-by-keyword walk over the token list (slow, obviously right)."""
+    tokens = task_detect._WORD_RE.findall(text.lower())
+    totals = {t: 0.0 for t in task_detect.TASK_TYPES}
+    for task_type, keywords in vocab.items():
+        for kw in keywords:
+            phrase, weight = (kw, 1.0) if isinstance(kw, str) else (kw[0], float(kw[1]))
+            phrase = phrase.lower().strip()
+            if phrase.endswith("*"):
+                hit = any(tok.startswith(phrase[:-1]) for tok in tokens)
+            else:
+                words = task_detect._WORD_RE.findall(phrase)
+                hit = any(tokens[i:i + len(words)] == words for i in range(len(tokens)))
+            totals[task_type] += weight if hit else 0.0
+    return totals
+
+def check_task_detect(trials=3000, seed=0):
+    for text, want in {**TASK_CHANGES, **TASK_SAME}.items():
+        assert task_detect.detect_task_type(text) == want, (text, task_detect.detect_task_type(text))
+
+    vocab = task_detect.json.load(open(task_detect.VOCAB_PATH, encoding="utf-8"))
+    vocab["explain"] = vocab["explain"] + ["how to", "how*", "what is the"]  # overlapping keywords
+    clf = task_detect.TaskClassifier(vocab)
+    pool = ["what", "is", "are", "the", "how", "show", "howto", "to", "solve", "solved", "integrals",
+            "integral", "proofread", "proof", "theorem", "cover", "letter", "topic", "sentence", "x2",
+            "sinus", "sin", "Essay", "ÉSSAY", "é", "explaining"]
+    seps = [" ", "  ", ", ", "-", "\n", "_", "'", "^2+", ""]
+    rng = random.Random(seed)
+    for _ in range(trials):
+        text = "".join(rng.choice(pool) + rng.choice(seps) for _ in range(rng.randint(0, 12))).lower()
+        assert clf.scores(text) == reference_scores(vocab, text), repr(text)
+    print(f"TaskClassifier matches the reference on {trials} random texts")
+
 if __name__ == "__main__":
     simulate()
+    check_draft_scorer()
+    check_task_detect()
@@ -0,0 +1,57 @@
+# backend/tests_single_flight.py
+import asyncio
+
+from single_flight import SingleFlight
+
+def check_follower_cancelled():
+    """A cancelled follower stops waiting; the leader and the other followers still get the result."""
+    async def run():
+        sf, calls = SingleFlight(), []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "reply"
+
+        leader = asyncio.create_task(sf.do_async("k", call))
+        await asyncio.sleep(0)
+        f1 = asyncio.create_task(sf.do_async("k", call))
+        f2 = asyncio.create_task(sf.do_async("k", call))
+        await asyncio.sleep(0.01)
+        f1.cancel()
+        results = await asyncio.gather(leader, f1, f2, return_exceptions=True)
+        assert results[0] == "reply" and results[2] == "reply", results
+        assert isinstance(results[1], asyncio.CancelledError), results
+        assert len(calls) == 1, calls
+
+    asyncio.run(run())
+    print("SingleFlight: cancelled follower leaves the flight intact")
+
+def check_leader_cancelled():
+    """Followers of a cancelled leader get a real result (one retried call), not None."""
+    async def run():
+        sf, calls = SingleFlight(window_s=1.0), []
+
+        async def call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return f"reply #{len(calls)}"
+
+        leader = asyncio.create_task(sf.do_async("k", call))
+        await asyncio.sleep(0)
+        followers = [asyncio.create_task(sf.do_async("k", call)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        results = await asyncio.gather(leader, *followers, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError), results
+        assert results[1:] == ["reply #2"] * 3, results
+        assert len(calls) == 2, calls
+        # the retried flight, not the cancelled one, is what a late caller joins
+        assert await sf.do_async("k", call) == "reply #2"
+
+    asyncio.run(run())
+    print("SingleFlight: cancelled leader's followers retry once")
+
+if __name__ == "__main__":
+    check_follower_cancelled()
+    check_leader_cancelled()
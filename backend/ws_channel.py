@@ -0,0 +1,153 @@
+# backend/ws_channel.py
+"""
+Plumbing for the long-lived /ws/{session_id} connection: one JSON object per
+text frame, a bounded outbound queue drained by a single writer task, and an
+application-level heartbeat (browsers can't send protocol pings from JS).
+
+Bounds per connection:
+    WS_MAX_MESSAGE_BYTES=131072 inbound frames larger than this close the socket (1009); fits
+                                a whole WS_MAX_DRAFT_CHARS draft even JSON-escaped (6 bytes
+                                per char at worst) plus the envelope
+    WS_SEND_QUEUE=64            outbound messages buffered for a slow client; chat turns
+                                wait for room (back-pressure on the LLM stream), meter
+                                updates are dropped instead (the next one supersedes them)
+    WS_SEND_TIMEOUT_S=10        a single frame that can't be written in this long closes the socket
+    WS_PING_S=20                server sends {"type": "ping"} this often
+    WS_IDLE_S=60                no inbound frame for this long closes the socket (1001)
+"""
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+MAX_MESSAGE_BYTES = int(os.getenv("WS_MAX_MESSAGE_BYTES", "131072"))
+SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "64"))
+SEND_TIMEOUT_S = float(os.getenv("WS_SEND_TIMEOUT_S", "10"))
+PING_S = float(os.getenv("WS_PING_S", "20"))
+IDLE_S = float(os.getenv("WS_IDLE_S", "60"))
+
+class ChannelClosed(Exception):
+    """The socket is gone (client left, idle, too slow or sent an oversized frame)."""
+
+class Channel:
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.out: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE)
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        self.closed = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def send(self, msg: dict) -> None:
+        """Queue a message, waiting while the client is behind."""
+        if self.closed.is_set():
+            raise ChannelClosed()
+        put = asyncio.ensure_future(self.out.put(msg))
+        closed = asyncio.ensure_future(self.closed.wait())
+        await asyncio.wait({put, closed}, return_when=asyncio.FIRST_COMPLETED)
+        closed.cancel()
+        if not put.done():
+            put.cancel()
+            raise ChannelClosed()
+
+    def offer(self, msg: dict) -> bool:
+        """Queue a message only if there is room (for updates that are superseded anyway)."""
+        if self.closed.is_set():
+            return False
+        try:
+            self.out.put_nowait(msg)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+
+    async def receive(self) -> dict:
+        recv = asyncio.ensure_future(self.ws.receive_text())
+        closed = asyncio.ensure_future(self.closed.wait())
+        await asyncio.wait({recv, closed}, return_when=asyncio.FIRST_COMPLETED)
+        closed.cancel()
+        if not recv.done():  # closed by the heartbeat or the writer
+            recv.cancel()
+            raise ChannelClosed()
+        try:
+            text = recv.result()
+        except (WebSocketDisconnect, RuntimeError):
+            self.closed.set()
+            raise ChannelClosed()
+        self.last_seen = time.monotonic()
+        if len(text) > MAX_MESSAGE_BYTES or len(text.encode("utf-8")) > MAX_MESSAGE_BYTES:
+            await self.close(1009, "message too big")
+            raise ChannelClosed()
+        try:
+            msg = json.loads(text)
+        except ValueError:
+            msg = None
+        if not isinstance(msg, dict):
+            return {"type": "invalid"}
+        return msg
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        if self.ws.application_state == WebSocketState.CONNECTED:
+            try:
+                await self.ws.close(code, reason)
+            except Exception as e:
+                print("WS CLOSE FAILED:", repr(e))
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Run a helper task for the lifetime of this connection."""
+        task = asyncio.create_task(coro)
+        self._tasks.append(task)
+        return task
+
+    async def _writer(self) -> None:
+        while True:
+            msg = await self.out.get()
+            try:
+                await asyncio.wait_for(self.ws.send_text(json.dumps(msg, ensure_ascii=False)), SEND_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                await self.close(1008, "client too slow")
+                return
+            except Exception:  # peer went away mid-write
+                self.closed.set()
+                return
+
+    async def _heartbeat(self) -> None:
+        while True:
+            await asyncio.sleep(PING_S)
+            if time.monotonic() - self.last_seen > IDLE_S:
+                await self.close(1001, "idle")
+                return
+            self.offer({"type": "ping"})
+
+stats = {"open": 0, "opened": 0, "dropped": 0}
+
+@asynccontextmanager
+async def open_channel(ws: WebSocket) -> AsyncIterator[Channel]:
+    """
+    async with open_channel(ws) as ch:
+        msg = await ch.receive()     # raises ChannelClosed when the socket is done
+        await ch.send({...})
+    """
+    await ws.accept()
+    ch = Channel(ws)
+    stats["open"] += 1
+    stats["opened"] += 1
+    ch.spawn(ch._writer())
+    ch.spawn(ch._heartbeat())
+    try:
+        yield ch
+    except ChannelClosed:
+        pass
+    finally:
+        stats["open"] -= 1
+        stats["dropped"] += ch.dropped
+        for t in ch._tasks:
+            t.cancel()
+        await ch.close()